@@ -0,0 +1,140 @@
+"""Benchmark of the LCO breakdown used for the simple (bar) plots.
+
+Compares the matrix based breakdown (calc_costs.breakdown_LCO_comps) with the previous row by row
+implementation (breakdown_LCO_comps_iterrows, kept here as the reference), checks that both give the
+same result and prints the timings.
+
+Usage:
+    python benchmarks/bench_breakdown.py [--repeat N]
+"""
+import argparse
+import math
+import os
+import re
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc import calc_costs
+from calc.calc_costs import calc_all_LCO_wbreakdown, breakdown_LCO_comps
+
+
+def breakdown_LCO_comps_iterrows(LCO_components):
+    # previous row by row implementation of calc_costs.breakdown_LCO_comps, the reference of the benchmark
+    LCO_components.replace(0.0, np.nan, inplace=True)
+
+    new_LCO_rows = []
+    LCO_components.apply(process_LCO_rows, axis=1, args=(LCO_components, new_LCO_rows))
+    updated_LCO = update_LCO_components(LCO_components, new_LCO_rows)
+
+    sectors_LCO, fuel_LCO = calc_costs.split_LCO_df(updated_LCO)
+    return sectors_LCO, fuel_LCO
+
+
+def process_LCO_rows(current_row, LCO_component_rows, new_LCO_rows):
+    # breaks up current row into its components and updates the LCO components
+
+    current_row = current_row.convert_dtypes().dropna()
+    tech_name = current_row["tech"]
+
+    if re.search("ship|steel|plane|chem|cement|fossil", tech_name):
+        # here, filter and select only the fuel rows - ignore ship, steel, etc
+        return
+
+    for _, other_row in LCO_component_rows.iterrows():
+        other_tech_name = other_row["tech"]
+        if current_row.name == other_row.name or math.isnan(
+            other_row.get(tech_name, np.nan)
+        ):
+            # make sure we're not multiplying h2 row by h2 row
+            # and check that tech_name is included in other_row AND is not nan
+            continue
+
+        param_fraction = other_row[tech_name] / current_row["LCO"]
+        # Removes tech,LCO entry and multiply
+        new_row = current_row.drop(["tech", "LCO"]).multiply(param_fraction)
+
+        # obtain list of tech with which rows have already been updated,
+        # see if some of them intersect with the new row
+        # if so, a second update with these results is needed
+        updated_params = [row["tech"] for row in new_LCO_rows]
+        common_subparams = list(set(new_row.keys()).intersection(updated_params))
+
+        for subparam in common_subparams:
+            # update the subparams with the "updated_params"
+            # choose the first row that matches the subparam
+            updated_subparam = next(
+                row for row in new_LCO_rows if row["tech"] == subparam
+            )
+
+            subparam_fraction = new_row[subparam] / updated_subparam["LCO"]
+
+            # Removes tech,LCO entry and clean up
+            new_subrow = updated_subparam.drop(["tech", "LCO"]).multiply(
+                subparam_fraction
+            )
+
+            # rename the new row for clarity
+            new_subrow = new_subrow.add_prefix(subparam + "_")
+            # add results to the row we are working with
+            new_row = pd.concat([new_row, new_subrow])
+
+        new_row = new_row.add_prefix(tech_name + "_")
+        new_row = pd.concat([other_row, new_row])
+
+        if other_tech_name not in updated_params:
+            # check whether the entry already exists in the new rows list.
+            new_LCO_rows.append(new_row)
+        else:
+            for idx, item in enumerate(new_LCO_rows):
+                if other_tech_name == item["tech"]:
+                    new_row = item.combine_first(new_row)
+                    new_LCO_rows[idx] = new_row
+
+
+def update_LCO_components(old_LCO_components, new_LCO_components):
+    old_LCO_components.set_index("tech", inplace=True)
+    new_LCO_components = (
+        pd.concat(new_LCO_components, axis=1).transpose().set_index("tech")
+    )
+    # merge: updated_LCO now contains all the details we want !
+    updated_LCO_components = new_LCO_components.combine_first(
+        old_LCO_components
+    ).dropna(axis=1, how="all")
+    return updated_LCO_components
+
+
+def get_components(**params):
+    _, LCO_components = calc_all_LCO_wbreakdown(**{"h2_LCO": 70, "co2_LCO": 300, "co2ts_LCO": 15, **params})
+    return LCO_components
+
+
+def check_same_result(LCO_components):
+    new = breakdown_LCO_comps(LCO_components.copy())
+    ref = breakdown_LCO_comps_iterrows(LCO_components.copy())
+    for df_new, df_ref in zip(new, ref):
+        pd.testing.assert_frame_equal(df_new, df_ref.infer_objects(), check_dtype=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="number of runs per implementation")
+    args = parser.parse_args()
+
+    LCO_components = get_components()
+    check_same_result(LCO_components)
+
+    timings = {}
+    for name, func in [("iterrows", breakdown_LCO_comps_iterrows), ("matrix", breakdown_LCO_comps)]:
+        runs = timeit.repeat(lambda: func(LCO_components.copy()), number=1, repeat=args.repeat)
+        timings[name] = min(runs)
+        print(f"{name:>10}: {timings[name] * 1000:8.2f} ms (best of {args.repeat})")
+    print(f"{'speedup':>10}: {timings['iterrows'] / timings['matrix']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Load test of the webapp, replaying the Dash callback requests of the GENERATE buttons.
+
+The callback triggered by a button and the values of its inputs and states are read from the app
+(/_dash-dependencies and /_dash-layout), so that the requests are the ones sent by the browser. Each
+scenario sends requests from concurrent virtual users, each with its own session id:
+    simple-update   the GENERATE button of the levelized costs page
+    heatmap-update  the GENERATE button of the heat maps
+With --vary, the parameters of each request are drawn at random (so that the caches are missed).
+
+The requests go to the Flask app in this process (Flask test client, default), or to a running server
+(--url). Reports the latency percentiles (p50, p95, p99) and the throughput of each scenario.
+
+Usage:
+    python benchmarks/loadtest.py [--scenario simple-update heatmap-update] [--requests N] [--users N]
+                                  [--vary] [--url http://127.0.0.1:8050] [--output report.json]
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# button triggering the callback of each scenario, and the parameters drawn with --vary: id -> (min, max)
+SCENARIOS = {
+    'simple-update': {
+        'simple-h2-LCO': (0, 240),
+        'simple-co2-LCO': (0, 1200),
+        'simple-co2ts-LCO': (5, 50),
+    },
+    'heatmap-update': {
+        'co2ts-LCO-hm': (5, 50),
+    },
+}
+UPDATE_PATH = '/_dash-update-component'
+
+
+class Client:
+    """Sends requests to the Flask app in this process, or to a server"""
+
+    def __init__(self, app=None, url=None):
+        self.url = url.rstrip('/') if url else None
+        self._local = threading.local()
+        self._app = app
+
+    def get_json(self, path):
+        if self.url:
+            with urllib.request.urlopen(self.url + path) as response:
+                return json.load(response)
+        response = self._test_client().get(path)
+        return response.get_json()
+
+    def post_json(self, path, payload) -> int:
+        """Posts a JSON payload, returns the HTTP status"""
+        if self.url:
+            request = urllib.request.Request(self.url + path, data=json.dumps(payload).encode(),
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+        response = self._test_client().post(path, json=payload)
+        response.get_data()
+        return response.status_code
+
+    def _test_client(self):
+        # one test client per thread
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._app.test_client()
+        return self._local.client
+
+
+def find_callback(dependencies: list, button: str) -> dict:
+    """Returns the callback triggered by the n_clicks of a button"""
+    for callback in dependencies:
+        if any(i['id'] == button and i['property'] == 'n_clicks' for i in callback['inputs']):
+            return callback
+    raise LookupError(f"no callback is triggered by {button}.n_clicks")
+
+
+def get_layout_props(layout) -> dict:
+    """Returns the props of the components of a Dash layout (JSON), id -> props"""
+    props = {}
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif isinstance(node, dict):
+            if 'props' in node and 'type' in node:
+                if isinstance(node['props'].get('id'), str):
+                    props[node['props']['id']] = node['props']
+                stack.extend(node['props'].values())
+            else:
+                stack.extend(node.values())
+    return props
+
+
+def parse_outputs(output: str):
+    # "id.prop" for a single output, "..id1.prop1...id2.prop2.." for several
+    def parse(spec):
+        component_id, prop = spec.rsplit('.', 1)
+        return {'id': component_id, 'property': prop}
+
+    if output.startswith('..'):
+        return [parse(spec) for spec in output[2:-2].split('...')]
+    return parse(output)
+
+
+def make_payload(callback: dict, values: dict, button: str, n_clicks: int) -> dict:
+    """Dash update request of a callback, as sent by the browser when the button is clicked
+
+    Args:
+        callback (dict): the callback, from /_dash-dependencies
+        values (dict): (id, property) -> value of the inputs and states
+        button (str): id of the clicked button
+        n_clicks (int): number of clicks of the button
+    """
+    def entry(dependency):
+        key = (dependency['id'], dependency['property'])
+        value = n_clicks if dependency['id'] == button else values.get(key)
+        return {'id': dependency['id'], 'property': dependency['property'], 'value': value}
+
+    return {
+        'output': callback['output'],
+        'outputs': parse_outputs(callback['output']),
+        'inputs': [entry(i) for i in callback['inputs']],
+        'state': [entry(s) for s in callback['state']],
+        'changedPropIds': [f"{button}.n_clicks"],
+    }
+
+
+def run_scenario(client: Client, callback: dict, values: dict, scenario: str, n_requests: int, n_users: int,
+                 vary: bool, seed: int) -> dict:
+    """Sends n_requests requests of a scenario from n_users concurrent users
+
+    Returns:
+        dict: number of requests and errors, latency percentiles (ms), mean latency and throughput (requests/s)
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def user(user_index):
+        rng = random.Random(seed + user_index)
+        user_values = dict(values)
+        user_values[('session-id', 'data')] = uuid.uuid4().hex
+        for n_clicks, _ in enumerate(iter(lambda: next(counter, None), None), start=1):
+            if vary:
+                for component_id, (low, high) in SCENARIOS[scenario].items():
+                    user_values[(component_id, 'value')] = rng.randint(low, high)
+            payload = make_payload(callback, user_values, scenario, n_clicks)
+            start = time.perf_counter()
+            status = client.post_json(UPDATE_PATH, payload)
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if status in (200, 204) else errors).append(elapsed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(n_users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    result = {'requests': len(latencies) + len(errors), 'errors': len(errors), 'users': n_users,
+              'wall_time_s': wall_time, 'throughput_rps': (len(latencies) + len(errors)) / wall_time}
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        result.update({'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                       'mean_ms': statistics.mean(latencies) * 1000, 'max_ms': max(latencies) * 1000})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=50, help="number of requests per scenario")
+    parser.add_argument("--users", type=int, default=4, help="number of concurrent users")
+    parser.add_argument("--vary", action="store_true", help="draw the parameters of each request at random")
+    parser.add_argument("--warmup", type=int, default=2, help="requests sent before each scenario, not reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="URL of a running server, instead of the app in this process")
+    parser.add_argument("--app", default="webapp:webapp",
+                        help="module:object of the piw webapp in this process (default: %(default)s)")
+    parser.add_argument("--output", help="path the JSON report is written to")
+    args = parser.parse_args()
+
+    if args.url:
+        client = Client(url=args.url)
+    else:
+        module_name, name = args.app.split(':')
+        webapp = getattr(importlib.import_module(module_name), name)
+        webapp.start()
+        client = Client(app=webapp.flask_app)
+
+    dependencies = client.get_json('/_dash-dependencies')
+    props = get_layout_props(client.get_json('/_dash-layout'))
+
+    report = {'meta': {'url': args.url, 'vary': args.vary, 'users': args.users}, 'results': {}}
+    for scenario in args.scenario:
+        callback = find_callback(dependencies, scenario)
+        values = {
+            (d['id'], d['property']): props.get(d['id'], {}).get(d['property'])
+            for d in callback['inputs'] + callback['state']
+        }
+        if args.warmup:
+            run_scenario(client, callback, values, scenario, args.warmup, 1, args.vary, args.seed - 1)
+        result = run_scenario(client, callback, values, scenario, args.requests, args.users, args.vary, args.seed)
+        report['results'][scenario] = result
+        print(f"{scenario:>15}: {result['requests']} requests ({result['errors']} errors), "
+              f"p50 {result.get('p50_ms', np.nan):8.1f} ms, p95 {result.get('p95_ms', np.nan):8.1f} ms, "
+              f"p99 {result.get('p99_ms', np.nan):8.1f} ms, {result['throughput_rps']:6.1f} requests/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Benchmark suite of the calculation, selection, breakdown and plotting hot paths.
+
+Runs fixed workloads, each repeat with empty caches (calc.cache), and reports the run times and the peak
+memory allocated by Python (tracemalloc, measured in an extra run). The report can be saved as JSON and
+compared with a baseline report: a workload regresses if its best time or its peak memory exceeds the
+baseline by more than the threshold.
+
+The plot workloads need piw, they are skipped if it is not installed. They call the plot methods without
+the figure cache (see BasePlot.cached_figures).
+
+Usage:
+    python benchmarks/suite.py [--repeat N] [--only NAME ...] [--output report.json]
+                               [--baseline baseline.json] [--threshold 0.2]
+
+Exits with status 1 if a workload regressed.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calc import cache
+from calc import calc_costs
+from calc import engine
+from calc import process_full_df
+from src import load
+from src import proc
+from src.utils import load_yaml_config_file
+
+
+# parameters of the workloads
+PARAMS = {"h2_LCO": 100, "co2_LCO": 200, "co2ts_LCO": 15}
+HM_INPUTS = {
+    "co2ts-LCO-hm": 30,
+    "ccu_attribution": 0.5,
+    "selected_case": "ccu",
+    "steel_capex": load.STEEL_CAPEX_DEFAULT,
+}
+# relative increase of the best time or the peak memory reported as a regression
+THRESHOLD = 0.2
+
+
+class Workload:
+    """A benchmarked function call
+
+    Args:
+        name (str): name in the report
+        run (callable): the benchmarked call, taking the result of setup
+        setup (callable): prepares the arguments of run, not timed. Called before every run
+    """
+
+    def __init__(self, name, run, setup=lambda: None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+def get_workloads() -> list:
+    """Returns the workloads, and the skipped ones (name -> reason)"""
+    workloads = [
+        Workload("calc_all_LCO", lambda _: calc_costs.calc_all_LCO(**PARAMS)),
+        Workload("calc_all_LCO_wbreakdown", lambda _: calc_costs.calc_all_LCO_wbreakdown(**PARAMS)),
+        Workload("get_df", lambda _: [
+            process_full_df.get_df(scenario=scenario, **args, **PARAMS)
+            for scenario, args in process_full_df.SCENARIO_ARGS.items()
+        ]),
+        # both methods of the engine on the points of the heat map grid. The matrices of the matrix method are
+        # assembled in the first run and cached by the engine, as in the webapp
+        *(
+            Workload(
+                f"engine.evaluate({method})",
+                lambda points, method=method: engine.get_engine().evaluate(method=method, **points),
+                setup=lambda: engine.param_grid(load.get_heatmap_grid()),
+            )
+            for method in ("loop", "matrix")
+        ),
+        Workload(
+            "breakdown_LCO_comps",
+            lambda LCO_breakdown: calc_costs.breakdown_LCO_comps(LCO_breakdown),
+            setup=lambda: calc_costs.calc_all_LCO_wbreakdown(**PARAMS)[1],
+        ),
+        Workload("calc_heatmap_data", lambda _: load.calc_heatmap_data(load.get_heatmap_grid())),
+        # the precomputed data, read from the on-disk store
+        Workload("get_heatmap_data", lambda _: load.get_heatmap_data(), setup=load.get_heatmap_handle),
+        Workload("recalc_hm_df", lambda inputs: proc.recalc_hm_df(inputs), setup=lambda: dict(HM_INPUTS)),
+    ]
+
+    try:
+        from src.plots.FuelStackedBarPlot import FuelStackedBarPlot
+        from src.plots.StackedBarPlot import StackedBarPlot
+        from src.plots.AbatementCostPlot import AbatementCostPlot
+        from src.plots.HeatMapPlot import HeatMapPlot
+    except ImportError as e:
+        return workloads, {"plots": f"cannot import the plots ({e})"}
+
+    glob_cfg = load_yaml_config_file('global')
+    for plot_class in (FuelStackedBarPlot, StackedBarPlot, AbatementCostPlot, HeatMapPlot):
+        workloads.append(Workload(
+            f"{plot_class.__name__}.plot",
+            lambda args, plot_class=plot_class: plot_class.plot.__wrapped__(*args),
+            setup=lambda plot_class=plot_class: get_plot_args(plot_class, glob_cfg),
+        ))
+    return workloads, {}
+
+
+def get_plot_args(plot_class, glob_cfg: dict) -> tuple:
+    """Arguments of the plot method of a plot, with the default inputs (the webapp target)"""
+    inputs = {}
+    load.define_inputs(inputs)
+    inputs['trigger_id'] = None
+    outputs = {}
+    proc.process_inputs(inputs, outputs)
+
+    # the plots are created by piw, only the attributes used by the plot methods are set here
+    plot = plot_class.__new__(plot_class)
+    plot._glob_cfg = glob_cfg
+    plot._target = 'webapp'
+    return plot, inputs, outputs, list(plot_class.figs)
+
+
+def clear_caches():
+    for c in cache.CACHES.values():
+        c.clear()
+
+
+def measure(workload: Workload, repeat: int) -> dict:
+    """Runs a workload repeat times, and once more with tracemalloc
+
+    Returns:
+        dict: best, median and mean times (s), number of runs and peak memory (KiB)
+    """
+    times = []
+    for _ in range(repeat):
+        args = workload.setup()
+        clear_caches()
+        start = time.perf_counter()
+        workload.run(args)
+        times.append(time.perf_counter() - start)
+
+    args = workload.setup()
+    clear_caches()
+    tracemalloc.start()
+    try:
+        workload.run(args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.mean(times),
+        "runs": repeat,
+        "peak_kib": peak / 1024,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Compares a report with a baseline report
+
+    Returns:
+        list: (workload, metric, baseline value, value, ratio) of the regressions
+    """
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for metric in ("min_s", "peak_kib"):
+            ratio = result[metric] / base[metric] if base[metric] else np.inf
+            if ratio > 1 + threshold:
+                regressions.append((name, metric, base[metric], result[metric], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed runs per workload")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="workloads to run (default: all)")
+    parser.add_argument("--output", help="path the JSON report is written to")
+    parser.add_argument("--baseline", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="relative increase reported as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workloads, skipped = get_workloads()
+    if args.only:
+        unknown = set(args.only) - {w.name for w in workloads} - set(skipped)
+        if unknown:
+            parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+        workloads = [w for w in workloads if w.name in args.only]
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": {},
+        "skipped": skipped,
+    }
+    for workload in workloads:
+        result = measure(workload, args.repeat)
+        report["results"][workload.name] = result
+        print(f"{workload.name:>28}: {result['min_s'] * 1000:9.2f} ms (best of {args.repeat}), "
+              f"median {result['median_s'] * 1000:9.2f} ms, peak {result['peak_kib']:9.0f} KiB")
+    for name, reason in skipped.items():
+        print(f"{name:>28}: skipped, {reason}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        for name, metric, base, value, ratio in regressions:
+            print(f"REGRESSION {name} {metric}: {base:.4g} -> {value:.4g} ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
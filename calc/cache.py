@@ -0,0 +1,178 @@
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# number of decimals parameter values are rounded to in the cache keys
+ROUND_DIGITS = 6
+
+# all named caches, name -> LRUCache (see get_stats)
+CACHES = {}
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe least recently used cache, with hit, miss and eviction counters.
+    If a name is given, the cache is registered in CACHES for monitoring.
+
+    Attributes
+    ----------
+    maxsize : int
+        maximum number of entries
+    hits, misses, evictions : int
+        counters since creation (or the last clear)
+    """
+
+    def __init__(self, maxsize=128, name=None):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if name is not None:
+            CACHES[name] = self
+
+    def get(self, key, default=None):
+        """Returns the entry for key and marks it as recently used, or default if there is none (counted as a miss)"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Adds an entry, evicting the least recently used ones if the cache is full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        """Removes all entries and resets the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns the counters and the size of the cache as a dict"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+def canonical_key(params: dict, ndigits=ROUND_DIGITS):
+    """
+    Returns a hashable key for a dict of parameters, that does not depend on the order of the parameters.
+
+    Floats are rounded to ndigits decimals (so that e.g. 0.1 + 0.2 and 0.3 give the same key), and lists
+    are converted to tuples. Lists of names (e.g. inexistant_techs) are sorted.
+
+    Parameters:
+    params (dict): Parameter name -> value.
+    ndigits (int): Number of decimals floats are rounded to.
+
+    Returns:
+    tuple: The key.
+    """
+    return tuple(sorted((k, _canonical_value(v, ndigits)) for k, v in params.items()))
+
+
+def memoize(maxsize=128, ignore=(), name=None, version=None):
+    """
+    Decorator caching the results of a function in an LRUCache, keyed by canonical_key of its arguments.
+
+    All arguments are part of the key, including the flags (DACCS, CCU_coupling, ...) and the defaults,
+    except those listed in ignore. Results are copied when stored and when returned, so that callers can
+    modify them (e.g. the breakdown frames are modified in place).
+
+    Parameters:
+    maxsize (int): Maximum number of cached results.
+    ignore (tuple): Names of arguments that do not change the result and are left out of the key.
+    name (str): Name of the cache in CACHES, by default the module and name of the function.
+    version (callable): Called with the arguments (name -> value, including those in ignore), returns a
+        value added to the key, e.g. the version of a file the results depend on (see context.params_stamp).
+
+    Returns:
+    callable: The decorator. The decorated function has a cache attribute holding the LRUCache.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        cache = LRUCache(maxsize, name=name or f"{func.__module__}.{func.__name__}")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {}
+            for k, v in bound.arguments.items():
+                if signature.parameters[k].kind == inspect.Parameter.VAR_KEYWORD:
+                    params.update(v)
+                elif signature.parameters[k].kind == inspect.Parameter.VAR_POSITIONAL:
+                    params[k] = list(v)
+                else:
+                    params[k] = v
+            key = canonical_key({k: v for k, v in params.items() if k not in ignore})
+            if version is not None:
+                key = (key, version(params))
+
+            result = cache.get(key)
+            if result is None:
+                result = func(*args, **kwargs)
+                cache.put(key, _copy(result))
+                return result
+            return _copy(result)
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def get_stats():
+    """Returns the counters of all named caches, cache name -> LRUCache.stats()"""
+    return {name: cache.stats() for name, cache in CACHES.items()}
+
+
+def _canonical_value(value, ndigits):
+    if isinstance(value, dict):
+        return canonical_key(value, ndigits)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        values = tuple(_canonical_value(v, ndigits) for v in value)
+        if all(isinstance(v, str) for v in values):
+            values = tuple(sorted(values))
+        return values
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (float, np.floating, int, np.integer)):
+        # ints and floats with the same value give the same key, as they give the same results
+        return round(float(value), ndigits)
+    return value
+
+
+def _copy(result):
+    if isinstance(result, tuple):
+        return tuple(_copy(r) for r in result)
+    if hasattr(result, "copy"):
+        return result.copy()
+    return result
@@ -2,14 +2,11 @@ import numpy as np
 import pandas as pd
 import itertools
 import json
-from calc.tech_class import Tech
+from calc.context import CalcContext, params_stamp
+from calc import cache
 import re
-import math
 from pathlib import Path
 
-#define a global variable to store the last read json file data
-last_read_data = None
-
 def calc_all_LCO(
     path_to_params=str(Path(__file__).parent / 'params.json'),
     compensate_residual_ems=False,
@@ -18,8 +15,6 @@ def calc_all_LCO(
     load_json = True,
     **kwargs
 ):
-    global last_read_data
-
     if inexistant_techs is None:
         inexistant_techs = [
             "ccs_plane","h2_plane","ccs_ship","efuel_steel",
@@ -27,35 +22,24 @@ def calc_all_LCO(
         ]
 
     user_params = kwargs
-    Tech.COMMON_DICT = {}
     final_dict = {}
     # co2ts_components = []
 
-    # json file holds external assumptions, which are then updated by user inputs through kwargs
-    # to make to code faster, it is preferable to not load the json file every time, and instead use the last read data
-    # instead, the user can input their own parameter changes through the kwargs argument
-    if load_json:
-        with open(path_to_params) as f:
-            data = json.load(f)
-            last_read_data = data
-    else:
-        data = last_read_data
+    # json file holds external assumptions, which are then updated by user inputs through kwargs.
+    # The file is parsed once per process (and again only if it changed), the user parameters are applied to copies of the rows.
+    # each calculation works on its own context (parameters and tech registry), so calculations can run concurrently
+    context = CalcContext.from_file(path_to_params, user_params=user_params, reload=load_json)
 
     # initialise the techs using the assumptions from the json file
-    for row in data["techs"]:
-
-        #extract user-defined params
-        updated_params = {k.rsplit("_", 1)[1]: v for k, v in user_params.items() if k.rsplit("_", 1)[0] == row["key"]}
-        row.update(updated_params)
-        
+    for row in context.rows():
         #create the Techs to update the final dict
-        temp_tech = Tech(row, comp=compensate_residual_ems, ccu_income=ccu_income)
+        temp_tech = context.add_tech(row, comp=compensate_residual_ems, ccu_income=ccu_income)
 
         # #extract co2 transport and storage LCO component
         # co2ts_components.append([row["key"], temp_tech.get_co2_storage_cost()])
 
-    # get the final dict, which is generated from the last tech in the previous loop
-    final_dict.update(temp_tech.get_dict())
+    # get the final dict, which is generated from all the techs of the previous loop
+    final_dict.update(context.get_dict())
 
     ## add an empty entry for technologies that don't exist (inexistant_techs)
     # also rename h2 to h2/nh3
@@ -77,6 +61,7 @@ def calc_all_LCO(
     return df
 
 
+@cache.memoize(maxsize=128, ignore=("load_json",), version=params_stamp)
 def calc_all_LCO_wbreakdown(
     #path_to_params="./analysis/common/params.json",
     path_to_params=str(Path(__file__).parent / 'params.json'),
@@ -86,8 +71,6 @@ def calc_all_LCO_wbreakdown(
     load_json = True,
     **kwargs
 ):
-    global last_read_data
-
     if inexistant_techs is None:
         inexistant_techs = [
             "ccs_plane",
@@ -101,29 +84,17 @@ def calc_all_LCO_wbreakdown(
         ]
 
     user_params = kwargs
-    Tech.COMMON_DICT = {}
     final_dict = {}
     rows_LCO_comps = []
 
-    # json file holds external assumptions, which are then updated by user inputs through kwargs
-    # to make to code faster, it is preferable to not load the json file every time, and instead use the last read data
-    # instead, the user can input their own parameter changes through the kwargs argument
-    if load_json:
-        with open(path_to_params) as f:
-            data = json.load(f)
-            last_read_data = data
-    else:
-        data = last_read_data
+    # json file holds external assumptions, which are then updated by user inputs through kwargs.
+    # The file is parsed once per process (and again only if it changed), the user parameters are applied to copies of the rows.
+    # each calculation works on its own context (parameters and tech registry), so calculations can run concurrently
+    context = CalcContext.from_file(path_to_params, user_params=user_params, reload=load_json)
 
     # initialise the techs using the assumptions from the json file
-    for row in data["techs"]:
-        temp_dict = {
-            k.rsplit("_", 1)[1]: v
-            for k, v in user_params.items()
-            if k.rsplit("_", 1)[0] == row["key"]
-        }
-        row.update(temp_dict)
-        temp_tech = Tech(row, comp=compensate_residual_ems, ccu_income=ccu_income)
+    for row in context.rows():
+        temp_tech = context.add_tech(row, comp=compensate_residual_ems, ccu_income=ccu_income)
 
         # to get the individual LCO components
         rows_LCO_comps.append(temp_tech.LCO_comps)
@@ -178,105 +149,94 @@ def calc_FSCP(df):
     return df
 
 #currently only used for python interface. Change in the future
-#duplicate of breakdown_LCO_comps below
 def calc_LCO_breakdown(h2_cost=70, co2_cost=300, co2ts_cost=15):
     _, LCO_components = calc_all_LCO_wbreakdown(
-        get_LCO_comps=True,
         h2_LCO=h2_cost,
         co2_LCO=co2_cost,
         co2ts_LCO=co2ts_cost,
     )
-    LCO_components.replace(0.0, np.nan, inplace=True)
-
-    new_LCO_rows = []
-    LCO_components.apply(process_LCO_rows, axis=1, args=(LCO_components, new_LCO_rows))
-    updated_LCO = update_LCO_components(LCO_components, new_LCO_rows)
-
-    sectors_LCO, fuel_LCO = split_LCO_df(updated_LCO)
-    return sectors_LCO, fuel_LCO
+    return breakdown_LCO_comps(LCO_components)
 
 def breakdown_LCO_comps(LCO_components):
     #this function takes the LCO components and breaks them down into their subcomponents
     # eg. for an e-fuel plane flying on e-jet fuel, breaksdown the cost of e-jet fuel
     # into the cost of the electricity, the cost of the h2, the cost of the co2, etc.
+    # The LCO components are modified in place (zeros replaced by nan, tech as index), the plots rely on this.
     LCO_components.replace(0.0, np.nan, inplace=True)
 
-    new_LCO_rows = []
-    LCO_components.apply(process_LCO_rows, axis=1, args=(LCO_components, new_LCO_rows))
-    updated_LCO = update_LCO_components(LCO_components, new_LCO_rows)
+    updated_LCO = expand_LCO_components(LCO_components)
+    LCO_components.set_index("tech", inplace=True)
 
     sectors_LCO, fuel_LCO = split_LCO_df(updated_LCO)
     return sectors_LCO, fuel_LCO
 
-def process_LCO_rows(current_row, LCO_component_rows, new_LCO_rows):
-    # breaks up current row into its components and updates the LCO components
-
-    current_row = current_row.convert_dtypes().dropna()
-    tech_name = current_row["tech"]
-
-    if re.search("ship|steel|plane|chem|cement|fossil", tech_name):
-        # here, filter and select only the fuel rows - ignore ship, steel, etc
-        return
-
-    for _, other_row in LCO_component_rows.iterrows():
-        other_tech_name = other_row["tech"]
-        if current_row.name == other_row.name or math.isnan(
-            other_row.get(tech_name, np.nan)
-        ):
-            # make sure we're not multiplying h2 row by h2 row
-            # and check that tech_name is included in other_row AND is not nan
+def expand_LCO_components(LCO_components):
+    """
+    Attributes the cost components of each fuel to the techs using it, e.g. e-jet fuel -> h2 -> elec.
+
+    The cost share matrix S[o, t] = (cost of fuel t in tech o) / (LCO of fuel t) is the feedstock
+    demand matrix in cost terms. For every fuel t (in the order of the rows), the components c of t are
+    attributed to all techs o using it in one step, as the outer product S[:, t] x components[t, :],
+    giving the columns "t_c". If c is itself a tech that was already broken down, its own (already
+    expanded) components are attributed as well, giving the columns "t_c_x".
+    Produces the same columns and values as the previous row by row implementation (see benchmarks/bench_breakdown.py).
+
+    Parameters:
+    LCO_components (pd.DataFrame): The LCO components, one row per tech, with zeros replaced by nan.
+
+    Returns:
+    pd.DataFrame: The expanded components, indexed by tech, with sorted rows and columns.
+    """
+    techs = LCO_components["tech"].tolist()
+    comp_cols = [col for col in LCO_components.columns if col not in ("tech", "LCO")]
+    values = LCO_components[comp_cols].to_numpy(dtype=float)
+    LCO = LCO_components["LCO"].to_numpy(dtype=float)
+    pos = {tech: i for i, tech in enumerate(techs)}
+
+    # expanded components, column name -> values for all techs
+    table = {"LCO": LCO.copy(), **{col: values[:, j].copy() for j, col in enumerate(comp_cols)}}
+    broken_down = np.zeros(len(techs), dtype=bool)
+
+    for t, tech_name in enumerate(techs):
+        if re.search("ship|steel|plane|chem|cement|fossil", tech_name) or tech_name not in comp_cols:
+            # only the fuel rows are broken down - ignore ship, steel, etc
             continue
 
-        param_fraction = other_row[tech_name] / current_row["LCO"]
-        # Removes tech,LCO entry and multiply
-        new_row = current_row.drop(["tech", "LCO"]).multiply(param_fraction)
-
-        # obtain list of tech with which rows have already been updated,
-        # see if some of them intersect with the new row
-        # if so, a second update with these results is needed
-        updated_params = [row["tech"] for row in new_LCO_rows]
-        common_subparams = list(set(new_row.keys()).intersection(updated_params))
-
-        for subparam in common_subparams:
-            # update the subparams with the "updated_params"
-            # choose the first row that matches the subparam
-            updated_subparam = next(
-                row for row in new_LCO_rows if row["tech"] == subparam
-            )
-
-            subparam_fraction = new_row[subparam] / updated_subparam["LCO"]
-
-            # Removes tech,LCO entry and clean up
-            new_subrow = updated_subparam.drop(["tech", "LCO"]).multiply(
-                subparam_fraction
-            )
-
-            # rename the new row for clarity
-            new_subrow = new_subrow.add_prefix(subparam + "_")
-            # add results to the row we are working with
-            new_row = pd.concat([new_row, new_subrow])
-
-        new_row = new_row.add_prefix(tech_name + "_")
-        new_row = pd.concat([other_row, new_row])
-
-        if other_tech_name not in updated_params:
-            # check whether the entry already exists in the new rows list.
-            new_LCO_rows.append(new_row)
-        else:
-            for idx, item in enumerate(new_LCO_rows):
-                if other_tech_name == item["tech"]:
-                    new_row = item.combine_first(new_row)
-                    new_LCO_rows[idx] = new_row
-
-def update_LCO_components(old_LCO_components, new_LCO_components):
-    old_LCO_components.set_index("tech", inplace=True)
-    new_LCO_components = (
-        pd.concat(new_LCO_components, axis=1).transpose().set_index("tech")
+        # techs using fuel t, and their share of it
+        users = ~np.isnan(values[:, comp_cols.index(tech_name)])
+        users[t] = False
+        if not users.any():
+            continue
+        share = values[users, comp_cols.index(tech_name)] / LCO[t]
+
+        # components of fuel t
+        sub_cols = [col for j, col in enumerate(comp_cols) if not np.isnan(values[t, j])]
+        sub_vals = values[t, [comp_cols.index(col) for col in sub_cols]]
+        block = np.outer(share, sub_vals)
+        new_cols = {f"{tech_name}_{col}": block[:, j] for j, col in enumerate(sub_cols)}
+
+        # components that were already broken down themselves
+        for j, col in enumerate(sub_cols):
+            if col not in pos or not broken_down[pos[col]]:
+                continue
+            sub_row = {k: v[pos[col]] for k, v in table.items() if k != "LCO" and not np.isnan(v[pos[col]])}
+            sub_share = block[:, j] / LCO[pos[col]]
+            for k, v in sub_row.items():
+                new_cols[f"{tech_name}_{col}_{k}"] = v * sub_share
+
+        # existing values take precedence, as in combine_first
+        for col, vals in new_cols.items():
+            column = table.setdefault(col, np.full(len(techs), np.nan))
+            column[users] = np.where(np.isnan(column[users]), vals, column[users])
+
+        broken_down |= users
+
+    updated_LCO_components = (
+        pd.DataFrame(table, index=pd.Index(techs, name="tech"))
+        .sort_index()
+        .sort_index(axis=1)
+        .dropna(axis=1, how="all")
     )
-    # merge: updated_LCO now contains all the details we want !
-    updated_LCO_components = new_LCO_components.combine_first(
-        old_LCO_components
-    ).dropna(axis=1, how="all")
     return updated_LCO_components
 
 def split_LCO_df(LCO_components):
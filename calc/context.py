@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from pathlib import Path
+from types import MappingProxyType
+
+from calc.tech_class import Tech
+
+
+DEFAULT_PARAMS_PATH = str(Path(__file__).parent / 'params.json')
+
+# parsed params files, path -> ParamSnapshot
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+class ParamSnapshot:
+    """
+    Read-only, parsed content of a params file. It is created once per process and params file
+    (see get_snapshot) and shared by all calculations, which never modify it.
+
+    Attributes
+    ----------
+    rows : tuple
+        the tech rows in the file order, as read-only mappings
+    keys : tuple
+        the tech keys, in the same order
+    stamp : tuple
+        modification time and size of the file when it was read, None if not read from a file
+    """
+
+    def __init__(self, data, stamp=None):
+        self.rows = tuple(MappingProxyType(dict(row)) for row in data["techs"])
+        self.keys = tuple(row["key"] for row in self.rows)
+        self.stamp = stamp
+
+
+class CalcContext:
+    """
+    Everything one techno-economic calculation works on: the tech parameters and the registry of the
+    techs calculated so far (previously the class level Tech.COMMON_DICT and calc_costs.last_read_data).
+
+    Each calculation (calc_all_LCO, calc_all_LCO_wbreakdown) creates its own context, so that several
+    calculations can run at the same time, e.g. in a thread pool, without sharing any mutable state.
+    The parameters are a shared ParamSnapshot, the user parameters are applied on copies of the rows
+    they change only (copy-on-write).
+
+    Attributes
+    ----------
+    snapshot : ParamSnapshot
+        the parameters, as read from the params file
+    overrides : dict
+        the user parameters indexed by tech, tech key -> {attribute: value}
+    techs : dict
+        registry of the calculated techs, key -> TechData
+    """
+
+    def __init__(self, snapshot, user_params=None):
+        self.snapshot = snapshot
+        self.overrides = index_overrides(user_params or {})
+        self.techs = {}
+
+    @classmethod
+    def from_file(cls, path_to_params=DEFAULT_PARAMS_PATH, user_params=None, reload=True):
+        """
+        Creates a context for the parameters of a params file.
+
+        Parameters
+        ----------
+            path_to_params : str
+                path to the params file
+            user_params : dict, optional
+                user parameters, named <tech key>_<attribute> (e.g. h2_LCO)
+            reload : bool, optional
+                whether to check if the file changed since it was read, and read it again if so (default is True)
+        """
+        return cls(get_snapshot(path_to_params, reload=reload), user_params)
+
+    def rows(self):
+        """Yields the tech rows in the file order, with the user parameters applied."""
+        for row in self.snapshot.rows:
+            overrides = self.overrides.get(row["key"])
+            yield row if overrides is None else {**row, **overrides}
+
+    def add_tech(self, row, comp=False, ccu_income=False) -> Tech:
+        """Calculates a tech using the techs already in the registry, and adds it to the registry."""
+        return Tech(row, comp=comp, ccu_income=ccu_income, registry=self.techs)
+
+    def get_dict(self) -> dict:
+        """Returns a dictionnary storing cost, emission and electricity usage data for all calculated techs."""
+        return {k: v.get_vals() for k, v in self.techs.items()}
+
+
+def get_snapshot(path_to_params=DEFAULT_PARAMS_PATH, reload=True) -> ParamSnapshot:
+    """
+    Returns the parsed params file. It is only parsed again if it changed since it was last read.
+
+    Parameters:
+    path_to_params (str): Path to the params file.
+    reload (bool): Whether to check if the file changed. If False, the last read version is used.
+
+    Returns:
+    ParamSnapshot: The parsed parameters.
+    """
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(path_to_params)
+        if snapshot is not None and not reload:
+            return snapshot
+
+        stat = os.stat(path_to_params)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if snapshot is None or snapshot.stamp != stamp:
+            with open(path_to_params) as f:
+                snapshot = ParamSnapshot(json.load(f), stamp)
+            _SNAPSHOTS[path_to_params] = snapshot
+        return snapshot
+
+
+def params_stamp(params: dict):
+    """
+    Returns the stamp of the params file a calculation reads, see get_snapshot. Used as the version
+    of the memoized calculations (see cache.memoize), so that they are not served stale after the
+    file changed.
+
+    Parameters:
+    params (dict): The arguments of the calculation, with the path_to_params and load_json arguments
+        of calc_all_LCO, if given.
+
+    Returns:
+    tuple: The modification time and size of the file, when it was last read.
+    """
+    path_to_params = params.get("path_to_params", DEFAULT_PARAMS_PATH)
+    return get_snapshot(path_to_params, reload=params.get("load_json", True)).stamp
+
+
+def index_overrides(params: dict) -> dict:
+    """
+    Indexes user parameters by tech.
+
+    Parameters:
+    params (dict): User parameters, named <tech key>_<attribute> (e.g. "h2_LCO" or "fossil_steel_capex").
+        Names without an underscore do not refer to a tech attribute and are ignored.
+
+    Returns:
+    dict: tech key -> {attribute: value}
+    """
+    overrides = {}
+    for k, v in params.items():
+        if "_" not in k:
+            continue
+        tech, attr = k.rsplit("_", 1)
+        overrides.setdefault(tech, {})[attr] = v
+    return overrides
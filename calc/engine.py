@@ -0,0 +1,500 @@
+import itertools
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calc.context import get_snapshot, index_overrides
+from calc.tech_class import Tech
+
+
+DEFAULT_PARAMS_PATH = str(Path(__file__).parent / 'params.json')
+
+# same defaults as in calc_costs.calc_all_LCO
+DEFAULT_INEXISTANT_TECHS = [
+    "ccs_plane", "h2_plane", "ccs_ship", "efuel_steel",
+    "ccs_chem", "h2_chem", "efuel_cement", "h2_cement",
+]
+
+RESULT_COLUMNS = ["cost", "em", "elec", "co2", "co2_comp"]
+
+# attributes that change the emissions, electricity or co2 demand of a tech (besides the feedstock demands).
+# All other numeric attributes (LCO, capex, opex, ...) only enter the levelized cost.
+PHYSICAL_ATTRS = {"co2em", "co2capt", "recycledco2", "co2ccusupply"}
+
+MAX_CACHED_SYSTEMS = 64
+
+
+class LCOEngine:
+    """
+    Array-based version of the Tech model, used to evaluate many parameter points at once.
+
+    The techs in params.json are parsed once. evaluate() then computes cost, effective emissions,
+    effective electricity demand and CO2 demand with numpy arrays of shape (N,), N being the number
+    of parameter points. Two methods are available:
+
+    - "loop" walks the techs in the json order (the same order in which Tech fills COMMON_DICT).
+      The results match calc_costs.calc_all_LCO point by point to the last bit, including the edge
+      cases of the Tech class (feedstocks defined later in the json are ignored, direct electricity
+      demand is counted twice, etc.).
+    - "matrix" assembles the input-output coefficient matrices of the feedstock chain (see
+      LeontiefSystem) and solves them. The matrices only depend on the physical parameters
+      (demands, emissions, ...) and are cached, so that a change of prices (h2_LCO, co2_LCO,
+      capex, ...) is a single matrix product. Results agree with "loop" to floating point precision.
+
+    Attributes
+    ----------
+    rows : list
+        the tech rows as read from the json file (see context.ParamSnapshot)
+    """
+
+    def __init__(self, path_to_params=DEFAULT_PARAMS_PATH, data=None):
+        # the rows are never modified, overrides are applied to copies
+        self.rows = list(get_snapshot(path_to_params).rows if data is None else data["techs"])
+        self._systems = {}
+        self._systems_lock = threading.Lock()
+
+    def evaluate(self, compensate_residual_ems=False, ccu_income=False, inexistant_techs=None, method="loop", **kwargs):
+        """
+        Evaluates all techs for N parameter points.
+
+        Parameters:
+        compensate_residual_ems (bool): Same as in calc_all_LCO.
+        ccu_income (bool): Same as in calc_all_LCO.
+        inexistant_techs (list): Same as in calc_all_LCO.
+        method (str): "loop" or "matrix", see the class docstring.
+        **kwargs: User parameters in the calc_all_LCO format (e.g. h2_LCO=70). Values can be scalars
+            or arrays, which are broadcast against each other and flattened into N points.
+
+        Returns:
+        GridResult: The (N x techs) result arrays.
+        """
+        if inexistant_techs is None:
+            inexistant_techs = DEFAULT_INEXISTANT_TECHS
+
+        params = _broadcast_params(kwargs)
+        n = len(next(iter(params.values()))) if params else 1
+        overrides = index_overrides(params)
+        rows = [{**row, **overrides.get(row["key"], {})} for row in self.rows]
+
+        if method == "loop":
+            vals = self._evaluate_loop(rows, n, compensate_residual_ems, ccu_income)
+        elif method == "matrix":
+            vals = self._evaluate_matrix(rows, n, compensate_residual_ems, ccu_income)
+        else:
+            raise ValueError(f'unknown method "{method}", expected "loop" or "matrix"')
+
+        # a key defined twice replaces the values, but keeps its position (as a dict update would)
+        index, codes = {}, {}
+        for i, attrs in enumerate(rows):
+            index[attrs["key"]] = i
+            codes[attrs["key"]] = attrs["desc"]
+
+        techs = list(codes)
+        columns = [index[t] for t in techs]
+        arrays = {col: vals[col][:, columns] for col in RESULT_COLUMNS}
+        tech_codes = list(codes.values())
+
+        # add an empty entry for technologies that don't exist (inexistant_techs)
+        for tech in inexistant_techs:
+            code = "no " + tech.split("_")[0].replace("h2", "h2/nh3")
+            if tech in techs:
+                pos = techs.index(tech)
+                tech_codes[pos] = code
+                for col in RESULT_COLUMNS:
+                    arrays[col][:, pos] = np.nan
+            else:
+                techs.append(tech)
+                tech_codes.append(code)
+                for col in RESULT_COLUMNS:
+                    arrays[col] = np.concatenate([arrays[col], np.full((n, 1), np.nan)], axis=1)
+
+        return GridResult(techs, tech_codes, arrays, params, n)
+
+    def get_system(self, rows, comp=False, ccu_income=False, key=None):
+        """
+        Returns the (cached) LeontiefSystem for the given tech rows.
+
+        Parameters:
+        rows (list): Tech rows, with overrides applied. Physical attributes must be scalars.
+        comp (bool): Same as compensate_residual_ems in calc_all_LCO.
+        ccu_income (bool): Same as in calc_all_LCO.
+        key (hashable): Cache key identifying the rows. If None, the system is not cached.
+
+        Returns:
+        LeontiefSystem: The assembled and solved system.
+        """
+        if key is not None:
+            with self._systems_lock:
+                if key in self._systems:
+                    return self._systems[key]
+
+        system = LeontiefSystem(rows, comp, ccu_income)
+
+        if key is not None:
+            with self._systems_lock:
+                if len(self._systems) >= MAX_CACHED_SYSTEMS:
+                    self._systems.pop(next(iter(self._systems)))
+                self._systems[key] = system
+        return system
+
+    def _evaluate_loop(self, rows, n, comp, ccu_income):
+        index = {}
+        vals = {col: [] for col in RESULT_COLUMNS}
+
+        for i, attrs in enumerate(rows):
+            res = self._evaluate_tech(attrs, index, vals, comp, ccu_income)
+            index[attrs["key"]] = i
+            for col in RESULT_COLUMNS:
+                vals[col].append(np.broadcast_to(res[col], (n,)).astype(float))
+
+        return {col: np.stack(vals[col], axis=1) for col in RESULT_COLUMNS}
+
+    @staticmethod
+    def _evaluate_tech(attrs, index, vals, comp, ccu_income):
+        """Mirrors Tech.append_dict for one tech, using the already evaluated techs in vals."""
+        def reg(name, col):
+            return vals[col][index[name]]
+
+        feedstock_demand, compensation, co2ccuincome = _parse_tech(attrs, comp, ccu_income)
+        known = [k for k in feedstock_demand if k in index]
+
+        # the terms are summed in the same order as in Tech, so that results are identical to the last bit
+        # emissions
+        co2_ccu = attrs["co2ccusupply"] * reg("co2ccu", "em") if "co2ccusupply" in attrs and "co2ccu" in index else 0
+        total_em = attrs.get("co2em", 0) - attrs.get("co2capt", 0) - co2_ccu - attrs.get("recycledco2", 0)
+        total_em = total_em + sum(feedstock_demand[k] * reg(k, "em") for k in known)
+
+        # electricity (direct electricity demand is counted twice, as in Tech.get_total_elec)
+        total_elec = feedstock_demand.get("elec", 0) + sum(
+            v if k in ("elec", "elecoffgrid") else v * reg(k, "elec")
+            for k, v in feedstock_demand.items()
+            if k in ("elec", "elecoffgrid") or k in index
+        )
+
+        # co2 demand
+        total_co2dem = feedstock_demand.get("co2", 0) + sum(feedstock_demand[k] * reg(k, "co2") for k in known)
+
+        if compensation:
+            eff_elec = total_elec + total_em * reg("co2", "elec")
+            eff_em = eff_elec * reg("elec", "em")
+        else:
+            eff_elec = total_elec
+            eff_em = total_em
+
+        # levelized cost
+        if "LCO" in attrs:
+            cost = attrs["LCO"]
+        else:
+            carbon_tax = total_em * reg("co2tax", "cost") if not compensation and "co2tax" in index else 0
+            storage = attrs["co2capt"] * reg("co2ts", "cost") if "co2capt" in attrs and "co2ts" in index else 0
+            comp_cost = total_em * reg("co2", "cost") + total_em * reg("co2ts", "cost") if compensation else 0
+            ccu = -attrs.get("co2ccusupply", 0) * reg("co2ccu", "cost") if co2ccuincome else 0
+
+            cost = (
+                _own_cost(attrs)
+                + sum(feedstock_demand[k] * reg(k, "cost") for k in known)
+                + carbon_tax
+                + storage
+                + comp_cost
+                + ccu
+            )
+
+        return {
+            "cost": cost,
+            "em": eff_em,
+            "elec": eff_elec,
+            "co2": total_co2dem,
+            "co2_comp": total_em - eff_em,
+        }
+
+    def _evaluate_matrix(self, rows, n, comp, ccu_income):
+        # the matrices only depend on the physical parameters, so points are grouped by their physical values
+        phys_keys = [
+            (i, k) for i, attrs in enumerate(rows) for k, v in attrs.items()
+            if (k in PHYSICAL_ATTRS or "demand" in k) and np.ndim(v)
+        ]
+        if phys_keys:
+            phys = np.stack([rows[i][k] for i, k in phys_keys], axis=1)
+            groups, inverse = np.unique(phys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+        else:
+            groups, inverse = np.zeros((1, 0)), np.zeros(n, dtype=int)
+
+        b = np.stack([np.broadcast_to(_price(attrs), (n,)) for attrs in rows], axis=1).astype(float)
+        vals = {col: np.empty((n, len(rows))) for col in RESULT_COLUMNS}
+
+        for g, group_vals in enumerate(groups):
+            points = inverse == g
+            group_rows = [dict(attrs) for attrs in rows]
+            for (i, k), v in zip(phys_keys, group_vals):
+                group_rows[i][k] = v
+
+            key = (comp, ccu_income, tuple(sorted(k for attrs in rows for k in attrs)), tuple(phys_keys), tuple(group_vals))
+            system = self.get_system(group_rows, comp, ccu_income, key=key)
+
+            vals["cost"][points] = system.solve(b[points])
+            for col in RESULT_COLUMNS[1:]:
+                vals[col][points] = getattr(system, col)
+
+        return vals
+
+
+class LeontiefSystem:
+    """
+    Input-output (Leontief) representation of the feedstock chain for fixed physical parameters.
+
+    Every tech i uses D[i, j] units of the techs j defined before it in the json file. The totals
+    of the Tech class then follow from linear systems x = s + A x, with A strictly lower triangular
+    in the json order:
+
+    - total emissions: s = direct emissions, A = D minus the CCU CO2 taken in charge (co2ccusupply)
+    - total electricity: s = direct electricity demand (counted twice, as in Tech), A = D without elec columns
+    - total co2 demand: s = direct non-fossil CO2 demand, A = D
+    - levelized cost: s = annualised capex, fixed opex and other costs (or the given LCO), A = D plus
+      the CO2 transport and storage, compensation, CO2 tax and CCU income coefficients. Rows of
+      techs with a given LCO are zero.
+
+    The effective electricity and emissions of compensated techs are computed after the solve, which
+    requires that compensated techs are not used as feedstock by other techs.
+
+    Attributes
+    ----------
+    keys : list
+        the tech keys, in the json order
+    D : np.ndarray
+        feedstock demand matrix
+    A : np.ndarray
+        cost coefficient matrix
+    L : np.ndarray
+        Leontief inverse of the cost system, (I - A)^-1
+    fixed : np.ndarray
+        boolean mask of the techs with a given LCO
+    total_em : np.ndarray
+        total emissions per tech (before compensation)
+    em, elec, co2, co2_comp : np.ndarray
+        effective emissions, effective electricity, co2 demand and compensated emissions per tech
+    """
+
+    def __init__(self, rows, comp=False, ccu_income=False):
+        size = len(rows)
+        self.keys = [attrs["key"] for attrs in rows]
+
+        D = np.zeros((size, size))
+        ccu_em = np.zeros((size, size))
+        A_elec = np.zeros((size, size))
+        s_em = np.zeros(size)
+        s_elec = np.zeros(size)
+        s_co2 = np.zeros(size)
+        fixed = np.zeros(size, dtype=bool)
+        compensated = {}  # tech -> (co2, elec) positions
+        cost_coeffs = []  # (tech, feedstock, coefficient), the coefficient being None for total emissions
+
+        index = {}
+        for i, attrs in enumerate(rows):
+            feedstock_demand, compensation, co2ccuincome = _parse_tech(attrs, comp, ccu_income)
+
+            for k, v in feedstock_demand.items():
+                if k not in index:
+                    continue
+                if index[k] in compensated:
+                    raise ValueError(f'the matrix method does not support compensated techs used as feedstock ("{k}" in "{attrs["key"]}")')
+                D[i, index[k]] += v
+                if k not in ("elec", "elecoffgrid"):
+                    A_elec[i, index[k]] += v
+
+            s_em[i] = attrs.get("co2em", 0) - attrs.get("co2capt", 0) - attrs.get("recycledco2", 0)
+            if "co2ccusupply" in attrs and "co2ccu" in index:
+                ccu_em[i, index["co2ccu"]] = attrs["co2ccusupply"]
+            s_elec[i] = feedstock_demand.get("elec", 0) + sum(
+                v for k, v in feedstock_demand.items() if k in ("elec", "elecoffgrid")
+            )
+            s_co2[i] = feedstock_demand.get("co2", 0)
+
+            if compensation:
+                # KeyErrors are raised as in Tech if co2, elec or co2ts are not defined
+                compensated[i] = (index["co2"], index["elec"])
+
+            fixed[i] = "LCO" in attrs
+            if not fixed[i]:
+                if not compensation and "co2tax" in index:
+                    cost_coeffs.append((i, index["co2tax"], None))
+                if "co2capt" in attrs and "co2ts" in index:
+                    cost_coeffs.append((i, index["co2ts"], attrs["co2capt"]))
+                if compensation:
+                    cost_coeffs.append((i, index["co2"], None))
+                    cost_coeffs.append((i, index["co2ts"], None))
+                if co2ccuincome:
+                    cost_coeffs.append((i, index["co2ccu"], -attrs.get("co2ccusupply", 0)))
+
+            index[attrs["key"]] = i
+
+        eye = np.eye(size)
+        # the CO2 from CCU taken in charge reduces the total emissions
+        total_em = np.linalg.solve(eye - D + ccu_em, s_em)
+        elec = np.linalg.solve(eye - A_elec, s_elec)
+        em = total_em.copy()
+        for i, (co2, grid_elec) in compensated.items():
+            elec[i] = elec[i] + total_em[i] * elec[co2]
+            em[i] = elec[i] * em[grid_elec]
+
+        A = D.copy()
+        for i, j, coeff in cost_coeffs:
+            A[i, j] += total_em[i] if coeff is None else coeff
+        A[fixed] = 0.0
+
+        self.D = D
+        self.A = A
+        self.L = np.linalg.inv(eye - A)
+        self.fixed = fixed
+        self.total_em = total_em
+        self.em = em
+        self.elec = elec
+        self.co2 = np.linalg.solve(eye - D, s_co2)
+        self.co2_comp = total_em - em
+
+    def solve(self, b):
+        """
+        Returns the levelized costs for the given own costs.
+
+        Parameters:
+        b (np.ndarray): (N x techs) own costs, i.e. the given LCO for techs that have one, and the
+            annualised capex, fixed opex and other costs for all other techs.
+
+        Returns:
+        np.ndarray: (N x techs) levelized costs.
+        """
+        return b @ self.L.T
+
+
+class GridResult:
+    """
+    Results of LCOEngine.evaluate.
+
+    Attributes
+    ----------
+    techs : list
+        the tech keys, in the same order as the rows of calc_all_LCO
+    codes : list
+        the tech descriptions (the "code" column of calc_all_LCO)
+    arrays : dict
+        (N x techs) arrays for cost, em, elec, co2 and co2_comp
+    params : dict
+        the flattened user parameters, each an array of length N
+    n : int
+        number of parameter points
+    """
+
+    def __init__(self, techs, codes, arrays, params, n):
+        self.techs = techs
+        self.codes = codes
+        self.arrays = arrays
+        self.params = params
+        self.n = n
+
+    def __getitem__(self, col):
+        return self.arrays[col]
+
+    def to_df(self) -> pd.DataFrame:
+        """Returns a long df with one calc_all_LCO-like block of rows per parameter point, plus a "point" column."""
+        n_techs = len(self.techs)
+        df = pd.DataFrame({
+            "point": np.repeat(np.arange(self.n), n_techs),
+            "tech": np.tile(np.array(self.techs, dtype=object), self.n),
+            "cost": self.arrays["cost"].ravel(),
+            "em": self.arrays["em"].ravel(),
+            "elec": self.arrays["elec"].ravel(),
+            "code": np.tile(np.array(self.codes, dtype=object), self.n),
+            "co2": self.arrays["co2"].ravel(),
+            "co2_comp": self.arrays["co2_comp"].ravel(),
+        })
+        for k, v in self.params.items():
+            df[k] = np.repeat(v, n_techs)
+        return df
+
+
+def param_grid(param_dict: dict) -> dict:
+    """
+    Returns the cartesian product of the given parameter ranges as flat arrays, in the same
+    order as itertools.product(*param_dict.values()).
+    """
+    points = list(itertools.product(*param_dict.values()))
+    return {k: np.array([p[i] for p in points]) for i, k in enumerate(param_dict)}
+
+
+def grid_size(param_dict: dict) -> int:
+    """Returns the number of points of param_grid(param_dict)."""
+    return int(np.prod([len(v) for v in param_dict.values()]))
+
+
+def param_grid_chunk(param_dict: dict, start: int, end: int) -> dict:
+    """
+    Returns the points start to end (excluded) of param_grid(param_dict), without building the
+    whole grid.
+    """
+    values = [np.array(list(v)) for v in param_dict.values()]
+    indices = np.unravel_index(np.arange(start, end), [len(v) for v in values])
+    return {k: v[i] for k, v, i in zip(param_dict, values, indices)}
+
+
+def _parse_tech(attrs, comp, ccu_income):
+    """Returns the feedstock demands and the compensation and CCU income flags of a tech, as set by Tech.__init__."""
+    key = attrs["key"]
+
+    feedstock_demand = {}
+    for k, v in attrs.items():
+        if k in ("key", "unit", "desc", "LCO", "capex", "opex", "othercosts", "flh", "wacc", "lifetime",
+                 "co2em", "co2capt", "compensation", "recycledco2", "offgrid", "co2ccusupply", "co2ccuincome"):
+            continue
+        if "demand" in k:
+            feedstock_demand[k[:k.index("demand")]] = v
+        else:
+            raise KeyError(f'key "{k}" is not in expected list of attributes')
+
+    if attrs.get("offgrid", False):
+        feedstock_demand["elecoffgrid"] = feedstock_demand.pop("elec")
+
+    in_sector = any(sector in key for sector in Tech.SECTORS) and "fossil" not in key
+    compensation = attrs.get("compensation", False) or (comp and in_sector)
+    co2ccuincome = attrs.get("co2ccuincome", False) or (ccu_income and in_sector)
+
+    if compensation and attrs.get("offgrid", False):
+        raise Exception("Compensation and offgrid electricity at the same time are not supported by current code version")
+
+    return feedstock_demand, compensation, co2ccuincome
+
+
+def _own_cost(attrs):
+    """Annualised capex, fixed opex and other costs of a tech (Tech.LCOX_wo_energy + Tech.get_other_costs)."""
+    wacc = attrs.get("wacc", 0.1)
+    lifetime = attrs.get("lifetime", 20)
+    flh = attrs.get("flh", 0.9)
+    anf = (wacc * (1 + wacc) ** lifetime) / ((1 + wacc) ** lifetime - 1)
+    ann_capex = attrs["capex"] * anf if "capex" in attrs else 0
+    fix_opex = attrs["opex"] * attrs["capex"] / 100 if "opex" in attrs and "capex" in attrs else 0
+    return (ann_capex + fix_opex) / flh + attrs.get("othercosts", 0)
+
+
+def _price(attrs):
+    """Entry of the price vector b of a LeontiefSystem: the given LCO, or the own cost of the tech."""
+    return attrs["LCO"] if "LCO" in attrs else _own_cost(attrs)
+
+
+def _broadcast_params(kwargs: dict) -> dict:
+    if not kwargs:
+        return {}
+    arrays = np.broadcast_arrays(*[np.atleast_1d(v) for v in kwargs.values()])
+    return {k: a.ravel() for k, a in zip(kwargs, arrays)}
+
+
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+
+
+def get_engine(path_to_params=DEFAULT_PARAMS_PATH) -> LCOEngine:
+    """Returns the engine for the given params file, parsing it only once per process."""
+    with _ENGINES_LOCK:
+        if path_to_params not in _ENGINES:
+            _ENGINES[path_to_params] = LCOEngine(path_to_params)
+        return _ENGINES[path_to_params]
@@ -0,0 +1,200 @@
+"""
+The results of the model as functions of the H2 and CO2 costs (the axes of the heat maps).
+
+All costs are linear in the feedstock prices (demand x price), while the emissions, electricity and co2
+demands do not depend on them. Every result is therefore an affine function of h2_LCO and co2_LCO:
+
+    value = intercept + slope_h2 * h2_LCO + slope_co2 * co2_LCO
+
+and so is the FSCP of every option, as the emission reduction it is divided by does not depend on the
+prices. The option with the lowest FSCP of a sector changes along straight lines in the (H2 cost, CO2 cost)
+plane.
+
+A Landscape is fitted from a single engine evaluation of four points. It gives the heat map data on any
+grid without evaluating the model again (rasterize).
+"""
+import numpy as np
+import pandas as pd
+
+from calc import cache
+from calc import engine
+from calc import process_full_df
+
+
+AXES = ("h2_LCO", "co2_LCO")
+# points (h2_LCO, co2_LCO) the affine functions are fitted on, and the point they are checked on
+FIT_POINTS = [(0.0, 0.0), (1.0, 0.0), (0.0, 1.0)]
+CHECK_POINT = (100.0, 500.0)
+# relative tolerance of the check
+RTOL = 1e-9
+
+# number of times the intervals of the axes are halved near the switches of the options, and maximum number of
+# points of the refined grid, see refine_axes
+REFINE_LEVELS = 2
+MAX_POINTS = 2500
+
+# fitted landscapes, see get_landscape
+landscapes = cache.LRUCache(maxsize=32, name="landscapes")
+
+
+class Landscape:
+    """
+    Affine model of the calc_all_LCO results in h2_LCO and co2_LCO, for a scenario and fixed values of the
+    other parameters.
+
+    Attributes
+    ----------
+    scenario : str
+        scenario name added to the results
+    CCU_coupling : bool
+        whether CCU options require both an uptaker and a producer (see process_full_df.select_options)
+    techs, codes : list
+        the tech keys and descriptions, as in engine.GridResult
+    intercept, slope_h2, slope_co2 : dict
+        column (cost, em, ...) -> (techs,) array of coefficients
+    params : dict
+        the values of the other parameters
+    """
+
+    def __init__(self, scenario=None, DACCS=True, CCU_coupling=False, compensate=False, **kwargs):
+        """
+        Fits the model.
+
+        Parameters
+        ----------
+            scenario, DACCS, CCU_coupling, compensate :
+                same as in process_full_df.get_df_grid
+            **kwargs :
+                the other parameters, as scalars (e.g. co2ts_LCO=15). h2_LCO and co2_LCO are the axes.
+
+        Raises
+        ------
+            ValueError
+                if an axis is given as a parameter, or if the results are not affine in the axes
+        """
+        if any(axis in kwargs for axis in AXES):
+            raise ValueError(f"{' and '.join(AXES)} are the axes of the landscape, they cannot be given as parameters.")
+
+        self.scenario = scenario
+        self.CCU_coupling = CCU_coupling
+
+        points = np.array(FIT_POINTS + [CHECK_POINT])
+        calc_all_LCO_args = process_full_df.get_calc_args(DACCS, CCU_coupling, compensate, **kwargs)
+        result = engine.get_engine().evaluate(
+            **dict(zip(AXES, points.T)),
+            **calc_all_LCO_args,
+        )
+
+        self.techs = result.techs
+        self.codes = result.codes
+        self.intercept = {col: v[0] for col, v in result.arrays.items()}
+        self.slope_h2 = {col: v[1] - v[0] for col, v in result.arrays.items()}
+        self.slope_co2 = {col: v[2] - v[0] for col, v in result.arrays.items()}
+        self.params = {k: v[0] for k, v in result.params.items() if k not in AXES}
+
+        check = self.evaluate(*CHECK_POINT)
+        for col, v in result.arrays.items():
+            if not np.allclose(check[col][0], v[-1], rtol=RTOL, atol=RTOL, equal_nan=True):
+                raise ValueError(f'The "{col}" results are not affine in {" and ".join(AXES)}.')
+        # the emissions are the denominator of the FSCPs
+        if np.any(np.abs(self.slope_h2["em"]) > RTOL) or np.any(np.abs(self.slope_co2["em"]) > RTOL):
+            raise ValueError(f"The emissions depend on {' and '.join(AXES)}, the FSCPs are not affine.")
+
+    def evaluate(self, h2_LCO, co2_LCO) -> engine.GridResult:
+        """
+        Returns the results for N points, as engine.LCOEngine.evaluate does.
+
+        Parameters:
+        h2_LCO, co2_LCO (float or np.ndarray): Values of the axes, broadcast against each other.
+
+        Returns:
+        engine.GridResult: The (N x techs) result arrays.
+        """
+        h2_LCO, co2_LCO = (np.ravel(v).astype(float) for v in np.broadcast_arrays(h2_LCO, co2_LCO))
+        n = len(h2_LCO)
+        arrays = {
+            col: self.intercept[col] + np.outer(h2_LCO, self.slope_h2[col]) + np.outer(co2_LCO, self.slope_co2[col])
+            for col in engine.RESULT_COLUMNS
+        }
+        params = {"h2_LCO": h2_LCO, "co2_LCO": co2_LCO, **{k: np.full(n, v) for k, v in self.params.items()}}
+        return engine.GridResult(self.techs, self.codes, arrays, params, n)
+
+    def rasterize(self, h2_values, co2_values) -> pd.DataFrame:
+        """
+        Returns the selected options on a grid, the same frame as process_full_df.get_df_grid on the
+        engine.param_grid of the axes (up to rounding errors in the last digits).
+
+        Parameters:
+        h2_values, co2_values (list): Values of the axes.
+
+        Returns:
+        pd.DataFrame: One row per point and sector with the selected option.
+        """
+        points = engine.param_grid(dict(zip(AXES, (h2_values, co2_values))))
+        result = self.evaluate(points["h2_LCO"], points["co2_LCO"])
+        return process_full_df.select_options_grid(result, scenario=self.scenario, CCU_coupling=self.CCU_coupling)
+
+
+def get_landscape(scenario=None, DACCS=True, CCU_coupling=False, compensate=False, **kwargs) -> Landscape:
+    """
+    Returns the (cached) Landscape for a scenario and values of the other parameters, see Landscape.
+    """
+    key = cache.canonical_key({"scenario": scenario, "DACCS": DACCS, "CCU_coupling": CCU_coupling,
+                               "compensate": compensate, **kwargs})
+    landscape = landscapes.get(key)
+    if landscape is None:
+        landscape = Landscape(scenario, DACCS, CCU_coupling, compensate, **kwargs)
+        landscapes.put(key, landscape)
+    return landscape
+
+
+def refine_axes(landscapes, h2_values, co2_values, levels=REFINE_LEVELS, max_points=MAX_POINTS) -> tuple:
+    """
+    Returns the axes of a grid refined near the switches of the selected options.
+
+    The grid is rasterized from the landscapes, and each interval between two values of an axis across
+    which the selected option of a sector changes is halved. This is repeated levels times, so that the
+    grid is finest along the boundaries between the options and stays coarse in the uniform regions.
+    The heat maps need a rectilinear grid, so a value is added to the whole axis. The intervals with the
+    most switches are halved first, as long as the grid has at most max_points points: every level
+    evaluates the grid once per landscape, so max_points also bounds the number of evaluations.
+
+    Parameters:
+    landscapes (list): The landscapes sharing the grid (e.g. the scenarios of the heat maps).
+    h2_values, co2_values (list): Values of the axes of the initial grid, in increasing order.
+    levels (int): Number of times the intervals are halved.
+    max_points (int): Maximum number of points of the refined grid.
+
+    Returns:
+    tuple: The refined values of h2_LCO and co2_LCO, as arrays.
+    """
+    axes = [np.asarray(h2_values, dtype=float), np.asarray(co2_values, dtype=float)]
+    for _ in range(levels):
+        if min((len(axes[0]) + 1) * len(axes[1]), len(axes[0]) * (len(axes[1]) + 1)) > max_points:
+            break
+        # number of switches across each interval of each axis, over the sectors, the other axis and the landscapes
+        switches = [np.zeros(len(values) - 1, dtype=int) for values in axes]
+        for landscape in landscapes:
+            options = _option_matrices(landscape.rasterize(*axes), axes)
+            switches[0] += np.sum(np.diff(options, axis=1) != 0, axis=(0, 2))
+            switches[1] += np.sum(np.diff(options, axis=2) != 0, axis=(0, 1))
+
+        intervals = sorted((-n, k, i) for k in range(2) for i, n in enumerate(switches[k]) if n > 0)
+        added = [[], []]
+        for _, k, i in intervals:
+            sizes = [len(axes[a]) + len(added[a]) + (a == k) for a in range(2)]
+            if sizes[0] * sizes[1] <= max_points:
+                added[k].append((axes[k][i] + axes[k][i + 1]) / 2)
+        if not added[0] and not added[1]:
+            break
+        axes = [np.sort(np.concatenate([axes[k], added[k]])) for k in range(2)]
+    return tuple(axes)
+
+
+def _option_matrices(df, axes):
+    # (sectors x h2 x co2) array of ids of the selected options, -1 where a sector has no selected option
+    _, sector_ids = np.unique(df["sector"].to_numpy(dtype=str), return_inverse=True)
+    option_ids = pd.factorize(df["tech"])[0]
+    options = np.full((sector_ids.max(initial=-1) + 1, len(axes[0]), len(axes[1])), -1)
+    options[sector_ids, np.searchsorted(axes[0], df["h2_LCO"]), np.searchsorted(axes[1], df["co2_LCO"])] = option_ids
+    return options
@@ -3,6 +3,10 @@ import pandas as pd
 import json
 from pathlib import Path
 from calc import calc_costs
+from calc import engine
+from calc import cache
+from calc.context import params_stamp
+from calc import selection
 
 # remove annoying warning that is irrelevant here
 pd.options.mode.chained_assignment = None  # default='warn'
@@ -132,8 +136,8 @@ def ccu_possible(df, big_df):
         return True, big_df
 
     ccu_sectors = df.loc[ccu_mask, "sector"]
-    uptakers = {"chem", "plane", "ship"}
-    producers = {"steel", "cement"}
+    uptakers = selection.CCU_UPTAKERS
+    producers = selection.CCU_PRODUCERS
 
     has_uptaker = ccu_sectors.isin(uptakers).any()
     has_producer = ccu_sectors.isin(producers).any()
@@ -142,12 +146,33 @@ def ccu_possible(df, big_df):
         return True, big_df
     
     #erlse:
-    big_df.loc[big_df["type"].eq("ccu"), "fscp"] = 100000
+    big_df.loc[big_df["type"].eq("ccu"), "fscp"] = selection.CCU_IMPOSSIBLE_FSCP
     return False, big_df
    
 
-def get_df(scenario = None, DACCS = True, CCU_coupling = False, compensate = False, retrofit = False, retrofit_techs = None, load_json = True, **kwargs):
-    # run the technoeconomic calculation
+# get_df arguments of each scenario (the heat map cases)
+SCENARIO_ARGS = {
+    "normal": {},
+    "ccu": {"CCU_coupling": True, "DACCS": True, "compensate": False},
+    "comp": {"CCU_coupling": True, "DACCS": False, "compensate": True},
+}
+
+
+def get_calc_args(DACCS = True, CCU_coupling = False, compensate = False, retrofit = False, retrofit_techs = None, **kwargs):
+    """
+    Returns the calc_all_LCO arguments corresponding to the given scenario flags.
+
+    Parameters:
+    DACCS (bool): Whether DACCS-based options (compensation, blue h2) exist.
+    CCU_coupling (bool): Whether CCU income is accounted for.
+    compensate (bool): Whether residual emissions are compensated.
+    retrofit (bool): Whether retrofit CAPEX are used for retrofit_techs.
+    retrofit_techs (list): The technologies to retrofit.
+    **kwargs: User parameters, passed on to calc_all_LCO.
+
+    Returns:
+    dict: The calc_all_LCO arguments.
+    """
     if retrofit and retrofit_techs is None:
         raise ValueError("If retrofit is True, retrofit_techs cannot be None. Please provide a list of technologies to retrofit.")
 
@@ -178,7 +203,6 @@ def get_df(scenario = None, DACCS = True, CCU_coupling = False, compensate = Fal
     calc_all_LCO_args = {
         "ccu_income": CCU_coupling,
         "compensate_residual_ems": compensate,
-        "load_json": load_json,
         **kwargs
     }
 
@@ -186,9 +210,149 @@ def get_df(scenario = None, DACCS = True, CCU_coupling = False, compensate = Fal
     if not DACCS:
         calc_all_LCO_args["inexistant_techs"] = inexistant_techs_ifNODACCS
 
+    return calc_all_LCO_args
+
+
+@cache.memoize(maxsize=128, ignore=("load_json",), version=params_stamp)
+def get_df(scenario = None, DACCS = True, CCU_coupling = False, compensate = False, retrofit = False, retrofit_techs = None, load_json = True, **kwargs):
+    # run the technoeconomic calculation
+    calc_all_LCO_args = get_calc_args(DACCS, CCU_coupling, compensate, retrofit, retrofit_techs, **kwargs)
+
     # Call calc_all_LCO
-    df_total = calc_costs.calc_all_LCO(**calc_all_LCO_args)
+    df_total = calc_costs.calc_all_LCO(load_json=load_json, **calc_all_LCO_args)
+
+    return select_options(df_total, scenario=scenario, CCU_coupling=CCU_coupling)
+
+
+def get_df_grid(scenario = None, DACCS = True, CCU_coupling = False, compensate = False, retrofit = False, retrofit_techs = None, sectors = None, **kwargs):
+    """
+    Same as get_df, but for many parameter points at once. The techno-economic calculation is done
+    in a single pass by the vectorised engine, and the option selection by select_options_grid.
+
+    Parameters:
+    scenario, DACCS, CCU_coupling, compensate, retrofit, retrofit_techs: Same as in get_df.
+    sectors (list): Sectors whose rows are returned, see select_options_grid. All sectors if None.
+    **kwargs: User parameters, each a scalar or an array with one value per parameter point
+        (see engine.param_grid).
+
+    Returns:
+    pd.DataFrame: The concatenated get_df results of all parameter points.
+    """
+    calc_all_LCO_args = get_calc_args(DACCS, CCU_coupling, compensate, retrofit, retrofit_techs, **kwargs)
+    result = engine.get_engine().evaluate(**calc_all_LCO_args)
+
+    return select_options_grid(result, scenario=scenario, CCU_coupling=CCU_coupling, sectors=sectors)
+
 
+def select_options_grid(result, scenario = None, CCU_coupling = False, sectors = None):
+    """
+    Same as select_options, for all the parameter points of an engine result at once.
+    The selection is done on (points x options) arrays, see calc.selection.
+
+    Parameters:
+    result (engine.GridResult): The engine results.
+    scenario (str): Scenario name added to the results, if given.
+    CCU_coupling (bool): Whether CCU options require both an uptaker and a producer.
+    sectors (list): Sectors whose rows are returned, all sectors if None. The options are always selected
+        over all sectors, as the sectors are not independent: besides the CCU coupling, the last tie-breaking
+        rule of get_lowest_fscp (drop_duplicates on the FSCP) applies across sectors. Only the rows of the
+        other sectors are left out.
+
+    Returns:
+    pd.DataFrame: The concatenated select_options results of all parameter points.
+    """
+    relevant_sectors = {"plane", "ship", "steel", "chem", "cement"}
+
+    # the options, in the order of the rows of select_options (tech order, sectors without fossil reference dropped)
+    columns, types, option_sectors = [], [], []
+    for i, tech in enumerate(result.techs):
+        if any(sec in tech for sec in relevant_sectors):
+            tech_type, _, sector = tech.partition("_")
+            columns.append(i)
+            types.append(tech_type)
+            option_sectors.append(sector)
+    fossil_columns = {sector: col for col, tech_type, sector in zip(columns, types, option_sectors) if tech_type == "fossil"}
+    options = [k for k, sector in enumerate(option_sectors) if sector in fossil_columns]
+    columns = [columns[k] for k in options]
+    types = np.array([types[k] for k in options], dtype=object)
+    option_sectors = np.array([option_sectors[k] for k in options], dtype=object)
+    fossil = [columns.index(fossil_columns[sector]) for sector in option_sectors]
+    sector_ids = np.unique(option_sectors, return_inverse=True)[1]
+
+    # (points x options) arrays
+    values = {col: result[col][:, columns] for col in engine.RESULT_COLUMNS}
+    values = {col: np.where(v == -1, np.nan, v) for col, v in values.items()}
+    for col in ["cost", "em", "elec"]:
+        values[f"{col}_fossil"] = values[col][:, fossil]
+    values["fscp"] = calc_costs.FSCP(values["cost"], values["em"], values["cost_fossil"], values["em_fossil"])
+
+    # rows with missing values are not considered, as in get_lowest_fscp
+    complete = np.ones(values["cost"].shape, dtype=bool)
+    for col, v in values.items():
+        if col != "fscp":
+            complete &= ~np.isnan(v)
+    params = {k: np.where(v == -1, np.nan, v) if np.any(v == -1) else v for k, v in result.params.items()}
+    for v in params.values():
+        if np.issubdtype(v.dtype, np.floating):
+            complete &= ~np.isnan(v)[:, None]
+    candidates = complete & ~np.isnan(values["fscp"])
+
+    best = selection.lowest_fscp_mask(values["fscp"], values["cost"], values["em"], candidates, sector_ids)
+    second_best_candidates = candidates & ~best
+
+    if CCU_coupling:
+        # where ccu is not possible, the ccu options get a very large FSCP and the options are selected again
+        ccu_options = types == "ccu"
+        ccu_impossible = ~selection.ccu_possible_mask(best, np.array(["ccu" in t for t in types]), option_sectors)
+        values["fscp"] = np.where(ccu_impossible[:, None] & ccu_options, selection.CCU_IMPOSSIBLE_FSCP, values["fscp"])
+        candidates = complete & ~np.isnan(values["fscp"])
+        reselected = selection.lowest_fscp_mask(values["fscp"], values["cost"], values["em"], candidates, sector_ids)
+        best = np.where(ccu_impossible[:, None], reselected, best)
+        # removes any shading arising from CCU
+        second_best_candidates = candidates & ~best & ~ccu_options
+
+    second_best = selection.lowest_fscp_mask(values["fscp"], values["cost"], values["em"], second_best_candidates, sector_ids)
+    delta_fscp = selection.delta_fscp(values["fscp"], best, second_best, sector_ids)
+
+    # one row per selected option, point by point
+    if sectors is not None:
+        best &= np.isin(option_sectors, list(sectors))
+    points, options = np.nonzero(best)
+    techs = np.array(result.techs, dtype=object)[columns]
+    codes = np.array(result.codes, dtype=object)[columns]
+    df_temp = pd.DataFrame({
+        "tech": techs[options],
+        **{col: values[col][points, options] for col in ["cost", "em", "elec"]},
+        "code": codes[options],
+        **{col: values[col][points, options] for col in ["co2", "co2_comp"]},
+        **{k: v[points] for k, v in params.items()},
+        "type": types[options],
+        "sector": option_sectors[options],
+        **{col: values[col][points, options] for col in ["cost_fossil", "em_fossil", "elec_fossil", "fscp"]},
+        "delta_fscp": delta_fscp[points, options],
+    })
+
+    # add color column
+    df_temp["color_type"] = df_temp["type"].map(color_dict_series)
+
+    if scenario is not None:
+        df_temp["scenario"] = scenario
+
+    return df_temp
+
+
+def select_options(df_total, scenario = None, CCU_coupling = False):
+    """
+    Selects the best (lowest FSCP) mitigation option per sector from the calc_all_LCO results.
+
+    Parameters:
+    df_total (pd.DataFrame): The calc_all_LCO results.
+    scenario (str): Scenario name added to the results, if given.
+    CCU_coupling (bool): Whether CCU options require both an uptaker and a producer.
+
+    Returns:
+    pd.DataFrame: One row per sector with the selected option, its FSCP and the FSCP difference to the second best option.
+    """
     # overall data frame
     # commented out. This keeps an ID column in the final df, but makes the code faster
     #df_total.reset_index(inplace=True, drop=True)
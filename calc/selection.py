@@ -0,0 +1,117 @@
+"""
+Vectorised versions of the option selection of process_full_df (get_lowest_fscp and diff_fscp), for
+all parameter points at once.
+
+The options are given as (N points x R options) arrays, with the sector of each option in sector_ids.
+The options of all sectors are kept on a single axis, in the order of the rows of select_options,
+because the last tie-breaking rule (drop_duplicates on the FSCP) depends on the order of the rows
+across sectors. All functions reproduce the results of the pandas version point by point.
+"""
+import numpy as np
+
+
+# number of rows get_lowest_fscp expects, one per sector
+N_EXPECTED_ROWS = 5
+# delta FSCP when it is not defined (single option, or negative FSCPs), as in process_full_df.diff_fscp
+UNDEFINED_DELTA_FSCP = 1000
+
+# with ccu coupling, ccu options are only possible if selected in an uptaker and in a producer sector
+CCU_UPTAKERS = {"chem", "plane", "ship"}
+CCU_PRODUCERS = {"steel", "cement"}
+# FSCP given to the ccu options when ccu is not possible (it should tend to infinity mathematically)
+CCU_IMPOSSIBLE_FSCP = 100000
+
+
+def lowest_fscp_mask(fscp, cost, em, candidates, sector_ids):
+    """
+    Vectorised process_full_df.get_lowest_fscp.
+
+    Per point and sector, keeps the options with the lowest FSCP (all options if they are all negative,
+    options with an FSCP of 0 are always kept), then the lowest cost, then the lowest emissions. Each
+    rule is only applied if the previous one did not leave exactly one option per sector (5 options in
+    total). Remaining duplicates of the FSCP are dropped, keeping the first option.
+
+    Parameters:
+    fscp, cost, em (np.ndarray): (N x R) arrays.
+    candidates (np.ndarray): (N x R) boolean array of the options to select from (the rows of the df
+        passed to get_lowest_fscp, without the rows with missing values).
+    sector_ids (np.ndarray): (R,) array with the sector of each option.
+
+    Returns:
+    np.ndarray: (N x R) boolean array of the selected options.
+    """
+    keep = candidates.copy()
+    for sector in np.unique(sector_ids):
+        in_sector = keep & (sector_ids == sector)
+        all_negative = np.all(~in_sector | (fscp < 0), axis=1, keepdims=True)
+        min_fscp = np.min(np.where(in_sector, fscp, np.inf), axis=1, keepdims=True)
+        keep &= ~in_sector | all_negative | (fscp == min_fscp) | (fscp == 0)
+    done = keep.sum(axis=1) == N_EXPECTED_ROWS
+
+    # only applies to rows with negative FSCPs
+    for col in (cost, em):
+        keep = np.where(done[:, None], keep, _keep_lowest(keep, col, sector_ids))
+        done |= keep.sum(axis=1) == N_EXPECTED_ROWS
+
+    # if there are still duplicates (same cost and emission), keep the first one
+    fscp_kept = np.where(keep, fscp, np.nan)
+    same_fscp = fscp_kept[:, :, None] == fscp_kept[:, None, :]
+    duplicate = np.any(same_fscp & np.tri(keep.shape[1], k=-1, dtype=bool), axis=2)
+    keep &= ~(duplicate & ~done[:, None])
+    return keep
+
+
+def delta_fscp(fscp, best, second_best, sector_ids):
+    """
+    Vectorised process_full_df.diff_fscp, applied per sector to the best and second best options.
+
+    Parameters:
+    fscp (np.ndarray): (N x R) array.
+    best, second_best (np.ndarray): (N x R) boolean arrays of the best and second best options.
+    sector_ids (np.ndarray): (R,) array with the sector of each option.
+
+    Returns:
+    np.ndarray: (N x R) array with the difference between the two lowest FSCPs of the sector, at the
+        best options (nan elsewhere). UNDEFINED_DELTA_FSCP if the sector has a single option or a negative FSCP.
+    """
+    both = best | second_best
+    delta = np.full(fscp.shape, np.nan)
+    for sector in np.unique(sector_ids):
+        in_sector = both & (sector_ids == sector)
+        n_options = in_sector.sum(axis=1)
+        any_negative = np.any(in_sector & (fscp < 0), axis=1)
+        two_lowest = np.sort(np.where(in_sector, fscp, np.inf), axis=1)[:, :2]
+        with np.errstate(invalid="ignore"):
+            diff = two_lowest[:, -1] - two_lowest[:, 0]
+        diff = np.where((n_options == 1) | any_negative, UNDEFINED_DELTA_FSCP, diff)
+        delta = np.where(best & (sector_ids == sector), diff[:, None], delta)
+    return delta
+
+
+def ccu_possible_mask(best, ccu_options, option_sectors):
+    """
+    Vectorised process_full_df.ccu_possible: whether the selected options allow ccu at each point.
+
+    Parameters:
+    best (np.ndarray): (N x R) boolean array of the selected options.
+    ccu_options (np.ndarray): (R,) boolean array, True for the ccu options.
+    option_sectors (np.ndarray): (R,) array with the sector name of each option.
+
+    Returns:
+    np.ndarray: (N,) boolean array. False where a ccu option is selected, but not both in an uptaker
+        and a producer sector.
+    """
+    best_ccu = best & ccu_options
+    has_uptaker = np.any(best_ccu & np.isin(option_sectors, list(CCU_UPTAKERS)), axis=1)
+    has_producer = np.any(best_ccu & np.isin(option_sectors, list(CCU_PRODUCERS)), axis=1)
+    return ~np.any(best_ccu, axis=1) | (has_uptaker & has_producer)
+
+
+def _keep_lowest(keep, values, sector_ids):
+    # keeps the options with the lowest value of their sector
+    keep = keep.copy()
+    for sector in np.unique(sector_ids):
+        in_sector = keep & (sector_ids == sector)
+        min_value = np.min(np.where(in_sector, values, np.inf), axis=1, keepdims=True)
+        keep &= ~in_sector | (values == min_value)
+    return keep
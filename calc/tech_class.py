@@ -9,8 +9,9 @@ class Tech:
 
     Attributes
     ----------
-    common_dict : dict
-        a dictionary that stores common data for all instances of the class
+    COMMON_DICT : dict
+        a dictionary that stores the data (TechData) of the techs calculated so far, used for the feedstocks.
+        By default shared by all instances of the class, a separate registry can be passed to the constructor
     init_dict : dict
         a dictionary that stores initial data for the instance
     LCO_comps : dict
@@ -34,7 +35,7 @@ class Tech:
     COMMON_DICT: Dict = {}
     SECTORS = ['chem','plane','ship','cement','steel']
 
-    def __init__(self, init_dict, comp = False, ccu_income = False):
+    def __init__(self, init_dict, comp = False, ccu_income = False, registry = None):
         """
         Constructs all the necessary attributes for the Tech object.
 
@@ -46,7 +47,12 @@ class Tech:
                 A flag indicating if the instance is has full compensation of emissions activated (default is False).
             ccu_income : bool, optional
                 A flag indicating if the instance has Carbon Capture and Utilization income (default is False).
+            registry : dict, optional
+                The registry of the techs calculated so far (see calc.context.CalcContext), used instead of
+                the class level COMMON_DICT (default is None).
         """
+        if registry is not None:
+            self.COMMON_DICT = registry
 
         self.init_dict = init_dict
         self.LCO_comps = {}
@@ -1,6 +1,13 @@
-from dash import dcc, html, dash_table
+from dash import dcc, html, dash_table, callback, clientside_callback, no_update, Patch, Input, Output, State
 import dash_bootstrap_components as dbc
 
+from calc import cache
+from src import load
+from src import proc
+from src import session
+from src.plots.HeatMapPlot import HeatMapPlot
+from src.utils import load_yaml_config_file
+
 
 # define input fields with IDs and names
 input_fields = {
@@ -24,6 +31,17 @@ dropdown_options_case = [
     {'label': 'Full climate neutrality', 'value': 'comp'},
 ]
 
+# interval (ms) at which the recalculation of the heat maps is polled while it runs in the background
+HM_POLL_INTERVAL = 1000
+
+# global config, for the labels of the cases in the heat map titles
+glob_cfg = load_yaml_config_file('global')
+
+# id of the heat map graph (the figure name in HeatMapPlot.yml), and heat maps of all cases sent to the browser, per
+# data handle (see HeatMapPlot.client_cases)
+HM_FIG_ID = 'fig4'
+hm_client_cases = cache.LRUCache(maxsize=4, name="hm_client_cases")
+
 steel_capex_types = ["BF-BOF", "CCS for a BF-BOF", "DRI-EAF"]
 steel_capex_units = ["€/t", "€/t", "€/t"]
 
@@ -119,7 +137,7 @@ def hm_ctrl(default_inputs: dict):
         children=[
             html.P(
                 "This card allows you to control various parameters for the mitigation landscapes."+
-                " Loading the landscapes after changing parameters below takes up to 45 seconds.",
+                " After changing parameters below, the landscapes are recalculated in the background and updated when done.",
                 className='explanation'
             ),
             #co2 transport and storage cost
@@ -190,9 +208,105 @@ def hm_ctrl(default_inputs: dict):
             html.Div(
                 children=[
                     html.Button(id='heatmap-update', n_clicks=0, children='GENERATE', className='btn btn-primary'),
+                    # polls the recalculation of the heat maps shown (job id), and triggers their regeneration
+                    # (heatmap-ready) once it finished, see poll_hm_job below
+                    dcc.Interval(id='heatmap-poll', interval=HM_POLL_INTERVAL, disabled=True),
+                    dcc.Store(id='heatmap-job'),
+                    dcc.Store(id='heatmap-ready'),
+                    # id of the user session (one per browser tab), see proc.sessions
+                    dcc.Store(id='session-id', storage_type='session'),
+                    # default heat maps of all cases, see the switch_hm_case clientside callback below
+                    dcc.Store(id='hm-cases', data=get_hm_client_cases(default_inputs.get('full_hm_handle') or load.get_heatmap_handle())),
                 ],
                 className='card-element',
             ),
         ],
         className='side-card',
-    )]
\ No newline at end of file
+    )]
+
+
+def get_hm_client_cases(handle: str) -> dict:
+    """Default heat maps of all cases, as sent to the browser (created once per data handle)"""
+    cases = hm_client_cases.get(handle)
+    if cases is None:
+        cases = HeatMapPlot.client_cases(load.get_full_hm_cube(handle), glob_cfg)
+        hm_client_cases.put(handle, cases)
+    return cases
+
+
+# polls the heat map recalculation while the heat maps shown are waiting for it (the job id in the figure meta, see
+# HeatMapPlot.plot). The poll is disabled by the figure and not by the status of the job, so that it only stops once
+# the heat maps of the finished job are shown. Runs in the browser, the figure is not sent to the server
+clientside_callback(
+    """
+    function toggle_hm_poll(figure) {
+        const meta = (figure && figure.layout && figure.layout.meta) || {};
+        const jobId = meta.hm_job || null;
+        return [jobId === null, jobId];
+    }
+    """,
+    Output('heatmap-poll', 'disabled'),
+    Output('heatmap-job', 'data'),
+    Input(HM_FIG_ID, 'figure'),
+    prevent_initial_call=True,
+)
+
+
+# checks the status of the heat map recalculation without regenerating the page: the progress is shown in the title
+# of the heat maps while the job runs. Once it finished (or is unknown to this process), heatmap-ready is set to the
+# job id, which triggers the generate callback (see webapp.py and proc.HM_TRIGGERS) once per job
+@callback(
+    Output(HM_FIG_ID, 'figure', allow_duplicate=True),
+    Output('heatmap-ready', 'data'),
+    Input('heatmap-poll', 'n_intervals'),
+    State('heatmap-job', 'data'),
+    State('heatmap-ready', 'data'),
+    State('dropdown-case', 'value'),
+    prevent_initial_call=True,
+)
+def poll_hm_job(n_intervals, job_id, ready_job_id, selected_case):
+    if job_id is None:
+        return no_update, no_update
+
+    job = proc.hm_jobs.get(job_id)
+    if job is not None and not job.done():
+        fig = Patch()
+        fig['layout']['title']['text'] = HeatMapPlot.cfg['title'] + HeatMapPlot.case_label(selected_case, glob_cfg,
+                                                                                           job.progress())
+        return fig, no_update
+
+    return no_update, (job_id if job_id != ready_job_id else no_update)
+
+
+# creates the session id when the page is first loaded in a browser tab
+@callback(
+    Output('session-id', 'data'),
+    Input('session-id', 'data'),
+)
+def init_session_id(session_id):
+    return no_update if session_id else session.new_session_id()
+
+
+# switches the case of the heat maps in the browser, without a request, while the default heat maps are shown (the
+# heat maps recalculated with other parameters only exist for their case, they are generated on the server)
+clientside_callback(
+    """
+    function switch_hm_case(selected_case, cases, figure) {
+        const noUpdate = window.dash_clientside.no_update;
+        const meta = (figure && figure.layout && figure.layout.meta) || {};
+        if (!meta.hm_default || !cases || !(selected_case in cases.traces)) {
+            return noUpdate;
+        }
+        const title = typeof figure.layout.title === 'object' ? figure.layout.title : {};
+        return Object.assign({}, figure, {
+            data: JSON.parse(JSON.stringify(cases.traces[selected_case])),
+            layout: Object.assign({}, figure.layout, {title: Object.assign({}, title, {text: cases.titles[selected_case]})}),
+        });
+    }
+    """,
+    Output(HM_FIG_ID, 'figure', allow_duplicate=True),
+    Input('dropdown-case', 'value'),
+    State('hm-cases', 'data'),
+    State(HM_FIG_ID, 'figure'),
+    prevent_initial_call=True,
+)
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+
+# technology types, in the order of their type IDs, and the value of each type in the heat map colour scale
+TYPES = ["h2", "efuel", "comp", "ccu", "ccs"]
+TYPE_IDS = {"h2": 0, "efuel": 0.25, "comp":0.5, "ccu":0.75, "ccs":1}
+# type and code IDs of the grid points without data
+MISSING_TYPE = np.iinfo(np.uint8).max
+MISSING_CODE = np.iinfo(np.uint16).max
+
+
+class HeatMapCube:
+    """Dense representation of the heat map data, as (scenarios x sectors x h2 x co2) arrays
+
+    Replaces the long df (one row per scenario, sector and point, with text columns) for the heat map: the
+    technology types are stored as uint8 IDs, the FSCPs as float32, and the option descriptions as uint16 IDs in
+    a table of codes. The 2-D matrices of a sector are views of the arrays, no pivot is needed.
+
+    Attributes:
+        scenarios (list): the scenarios/cases
+        sectors (list): the sectors, in alphabetical order (see matrices for the data of one sector)
+        h2_LCO, co2_LCO (np.ndarray): the axes, in increasing order
+        type_id (np.ndarray): uint8 index in TYPES of the selected technology type, MISSING_TYPE without data
+        fscp, delta_fscp (np.ndarray): float32 FSCP of the selected option and difference to the second best
+        code_id (np.ndarray): uint16 index in code_table of the description of the selected option
+        code_table (list): the option descriptions
+    """
+
+    def __init__(self, scenarios, sectors, h2_LCO, co2_LCO, type_id, fscp, delta_fscp, code_id, code_table):
+        self.scenarios = list(scenarios)
+        self.sectors = list(sectors)
+        self.h2_LCO = h2_LCO
+        self.co2_LCO = co2_LCO
+        self.type_id = type_id
+        self.fscp = fscp
+        self.delta_fscp = delta_fscp
+        self.code_id = code_id
+        self.code_table = list(code_table)
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame):
+        """Creates the cube from the long heat map df (see load.get_heatmap_data and proc.recalc_hm_df)
+
+        Args:
+            df (pd.DataFrame): heat map data, with the columns scenario, sector, h2_LCO, co2_LCO, type, fscp,
+                delta_fscp and code
+
+        Returns:
+            HeatMapCube: the cube
+        """
+        scenarios = list(pd.unique(df["scenario"]))
+        sectors = sorted(pd.unique(df["sector"]))
+        h2_LCO = np.sort(pd.unique(df["h2_LCO"]))
+        co2_LCO = np.sort(pd.unique(df["co2_LCO"]))
+        index = (
+            pd.Index(scenarios).get_indexer(df["scenario"]),
+            pd.Index(sectors).get_indexer(df["sector"]),
+            pd.Index(h2_LCO).get_indexer(df["h2_LCO"]),
+            pd.Index(co2_LCO).get_indexer(df["co2_LCO"]),
+        )
+        shape = (len(scenarios), len(sectors), len(h2_LCO), len(co2_LCO))
+
+        type_id = np.full(shape, MISSING_TYPE, dtype=np.uint8)
+        type_codes = pd.Index(TYPES).get_indexer(df["type"])
+        type_id[index] = np.where(type_codes >= 0, type_codes, MISSING_TYPE)
+
+        fscp = np.full(shape, np.nan, dtype=np.float32)
+        fscp[index] = df["fscp"].to_numpy(dtype=np.float32)
+        delta_fscp = np.full(shape, np.nan, dtype=np.float32)
+        delta_fscp[index] = df["delta_fscp"].to_numpy(dtype=np.float32)
+
+        codes = pd.Categorical(df["code"])
+        code_id = np.full(shape, MISSING_CODE, dtype=np.uint16)
+        code_id[index] = np.where(codes.codes >= 0, codes.codes, MISSING_CODE)
+
+        return cls(scenarios, sectors, h2_LCO, co2_LCO, type_id, fscp, delta_fscp, code_id, codes.categories)
+
+    def matrices(self, scenario: str, sector: str) -> dict:
+        """The (h2 x co2) matrices of a scenario and sector, as needed by the heat map plot
+
+        Args:
+            scenario (str): the scenario/case
+            sector (str): the sector
+
+        Returns:
+            dict: type_ID (the colour value in [0, 1], nan without data), fscp, delta_fscp and code_id
+        """
+        i, k = self.scenarios.index(scenario), self.sectors.index(sector)
+        return {
+            "type_ID": self.type_values()[self.type_id[i, k]],
+            "fscp": self.fscp[i, k],
+            "delta_fscp": self.delta_fscp[i, k],
+            "code_id": self.code_id[i, k],
+        }
+
+    def labels(self, code_id: np.ndarray) -> np.ndarray:
+        """The option descriptions of code IDs (nan without data)"""
+        return np.array(self.code_table + [np.nan], dtype=object)[np.minimum(code_id, len(self.code_table))]
+
+    @staticmethod
+    def type_values() -> np.ndarray:
+        """Colour value of each type ID (see TYPE_IDS), nan for the missing ones"""
+        values = np.full(int(MISSING_TYPE) + 1, np.nan)
+        values[:len(TYPES)] = [TYPE_IDS[t] for t in TYPES]
+        return values
+
+    def hm_dfs(self, scenario: str) -> dict:
+        """The arrays of a scenario as dfs, one row per sector and h2_LCO value and one column per co2_LCO value
+        (e.g. to inspect or export the heat map data), built from the arrays without pivoting
+
+        Args:
+            scenario (str): the scenario/case
+
+        Returns:
+            dict: heatmap_df (type_ID colour values), contour_df (fscp), hm_transparency_df (delta_fscp) and
+                optioninfo_df (option descriptions), each (sector, h2_LCO) x co2_LCO
+        """
+        i = self.scenarios.index(scenario)
+        index = pd.MultiIndex.from_product([self.sectors, self.h2_LCO], names=["sector", "h2_LCO"])
+        columns = pd.Index(self.co2_LCO, name="co2_LCO")
+
+        def frame(values):
+            return pd.DataFrame(values.reshape(-1, len(self.co2_LCO)), index=index, columns=columns)
+
+        return {
+            'heatmap_df': frame(self.type_values()[self.type_id[i]]),
+            'contour_df': frame(self.fscp[i].astype(float)),
+            'hm_transparency_df': frame(self.delta_fscp[i].astype(float)),
+            'optioninfo_df': frame(self.labels(self.code_id[i])),
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays"""
+        return sum(a.nbytes for a in (self.h2_LCO, self.co2_LCO, self.type_id, self.fscp, self.delta_fscp, self.code_id))
@@ -0,0 +1,157 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from src import metrics
+
+
+# job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """A calculation running in the background, see JobManager
+
+    Attributes:
+        id (str): unique id of the job
+        key (hashable): key of the calculation, identical calculations have the same key
+        status (str): pending, running, done or failed
+        steps_done, steps_total (int): progress of the calculation, as reported by the calculation
+        step_label (str): description of the last finished step (e.g. the sector)
+        submitted, started, finished (float): times (time.time) of the status changes
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = PENDING
+        self.steps_done = 0
+        self.steps_total = None
+        self.step_label = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._future = None
+
+    def set_progress(self, steps_done, steps_total, step_label=None):
+        """Reports the progress, called by the calculation"""
+        self.steps_done = steps_done
+        self.steps_total = steps_total
+        self.step_label = step_label
+
+    def progress(self) -> dict:
+        """Returns the status and progress of the job as a dict"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "steps_done": self.steps_done,
+            "steps_total": self.steps_total,
+            "step_label": self.step_label,
+        }
+
+    def done(self) -> bool:
+        """Whether the job finished (successfully or not)"""
+        return self.status in (DONE, FAILED)
+
+    def wait(self, timeout=None) -> bool:
+        """Waits until the job finished or the timeout (in seconds) expired. Returns whether the job finished"""
+        wait([self._future], timeout=timeout)
+        return self.done()
+
+    def result(self, timeout=None):
+        """Returns the result of the calculation, waiting for it if needed. Raises the exception of a failed calculation"""
+        return self._future.result(timeout=timeout)
+
+
+class JobManager:
+    """Runs calculations in background threads, so that the callbacks do not wait for them
+
+    Identical calculations (same key) are only run once: submitting a calculation while an identical one is
+    pending, running, or finished recently returns the existing job, also for other users. Finished jobs are
+    kept until keep_finished newer jobs finished.
+
+    Args:
+        max_workers (int): number of calculations running at the same time
+        keep_finished (int): number of finished jobs kept
+    """
+
+    def __init__(self, max_workers=1, keep_finished=32):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args, **kwargs) -> Job:
+        """Starts a calculation in the background, unless an identical one exists
+
+        Args:
+            key (hashable): key of the calculation
+            func (callable): the calculation. It is called with args, kwargs and progress=Job.set_progress
+            *args, **kwargs: passed on to func
+
+        Returns:
+            Job: the new or the existing job
+        """
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and job.status != FAILED:
+                metrics.increment("jobs_reused")
+                return job
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            job._future = self._executor.submit(self._run, job, func, args, kwargs)
+            metrics.increment("jobs_submitted")
+            return job
+
+    def get(self, job_id):
+        """Returns the job with the given id, None if there is none"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find(self, key):
+        """Returns the job of a calculation, None if there is none"""
+        with self._lock:
+            return self._by_key.get(key)
+
+    def pending(self) -> list:
+        """Returns the jobs that did not finish yet"""
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done()]
+
+    def shutdown(self, wait=True):
+        """Stops the background threads, the pending jobs are cancelled"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, func, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            result = func(*args, progress=job.set_progress, **kwargs)
+        except BaseException:
+            job.status = FAILED
+            metrics.increment("jobs_failed")
+            raise
+        else:
+            job.status = DONE
+            return result
+        finally:
+            job.finished = time.time()
+            self._prune()
+
+    def _prune(self):
+        # removes the oldest finished jobs
+        with self._lock:
+            finished = [job for job in self._jobs.values() if job.done()]
+            for job in itertools.islice(finished, max(0, len(finished) - self.keep_finished)):
+                del self._jobs[job.id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
@@ -1,10 +1,11 @@
-from calc import process_full_df
-import multiprocessing as mp
-import itertools
-import matplotlib
+from calc import cache
+from calc import engine
+from calc import landscape
+from calc.process_full_df import SCENARIO_ARGS
+from src import store
+from src.cube import HeatMapCube, TYPE_IDS
 import numpy as np
 import pandas as pd
-import time
 
 
 #initial params
@@ -14,6 +15,10 @@ CO2TS_LCO_DEFAULT = 15.0
 CCU_ATTR_DEFAULT = 0.5
 STEEL_CAPEX_DEFAULT = [684, 196, 556]
 
+# heat map data held by this process, shared by all requests: (handle, scenario) -> df, see get_full_hm_df,
+# and (handle, HeatMapCube) -> HeatMapCube, see get_full_hm_cube
+full_hm_dfs = cache.LRUCache(maxsize=16, name="full_hm_dfs")
+
 def define_inputs(inputs: dict):
     inputs['params'] = {
         'h2_LCO': H2_LCO_DEFAULT,
@@ -31,47 +36,119 @@ def define_inputs(inputs: dict):
     #steel capex data. BF-BOF, CCS and DRI-EAF
     # in EUR/t before annualization
     inputs['steel_capex'] = STEEL_CAPEX_DEFAULT
-    #pre compute basic hm data
-    inputs['full_hm_df'] = get_heatmap_data()
+    #pre compute basic hm data. The data is held server side, the inputs only carry a handle to it (see get_full_hm_df)
+    inputs['full_hm_handle'] = get_heatmap_handle()
+
+
+def get_heatmap_axes():
+    """Values of the axes of the heat maps, for the precomputed and the recalculated data
+
+    Returns:
+        dict: h2_LCO and co2_LCO -> values
+    """
+    #define heatmap resolution
+    return {
+        "h2_LCO": np.arange(0, 245, 5),
+        "co2_LCO": np.arange(0, 1250, 50),
+    }
+
+def get_heatmap_grid():
+    """Grid of the precomputed heat map data
 
+    Returns:
+        dict: parameter name -> values
+    """
+    return {
+        **get_heatmap_axes(),
+        "co2ts_LCO": [CO2TS_LCO_DEFAULT],
+    }
+
+def get_heatmap_handle():
+    """Obtain the data for the heatmap, from the on-disk store if it was already computed, and keep it in this process
+
+    Returns:
+        str: handle of the data, see get_full_hm_df
+    """
+    param_dict = get_heatmap_grid()
+
+    # the data only depends on the params file and the grid. It is computed once and read from the store afterwards,
+    # also by the other web workers
+    key = store.get_key(param_dict)
+    if (key, None) not in full_hm_dfs:
+        full_hm_dfs.put((key, None), store.load_or_compute(key, lambda: calc_heatmap_data(param_dict)))
+    return key
 
 def get_heatmap_data():
-    """Obtain the data for the heatmap
+    """Obtain the data for the heatmap, from the on-disk store if it was already computed
+
+    Returns:
+        heatmap_df: df containing the data for the heatmap
+    """
+    return get_full_hm_df(get_heatmap_handle())
+
+def get_full_hm_cube(handle: str):
+    """Heat map data of a handle (see get_heatmap_handle) as a HeatMapCube, created once per process
 
     Args:
-        inputs (dict): Input parameters determined by the user
+        handle (str): handle of the data, a key of the on-disk store
 
     Returns:
-        heatmap_df: df containing the data for the heatmap
+        HeatMapCube: the heat map data. It is shared by all requests and must not be modified
     """
-    #define heatmap resolution
-    param_dict = {
-        "h2_LCO": np.arange(0, 245, 5),  # used to be 2
-        "co2_LCO": np.arange(0, 1300, 100),  # used to be 25
-        "co2ts_LCO": [CO2TS_LCO_DEFAULT],    
-    }
+    hm_cube = full_hm_dfs.get((handle, HeatMapCube))
+    if hm_cube is None:
+        hm_cube = HeatMapCube.from_df(get_full_hm_df(handle))
+        full_hm_dfs.put((handle, HeatMapCube), hm_cube)
+    return hm_cube
 
-    params = itertools.product(*param_dict.values())
+def get_full_hm_df(handle: str, scenario: str = None):
+    """Heat map data of a handle (see get_heatmap_handle). The data of each scenario is only filtered once per process
 
-    with mp.Pool(mp.cpu_count()) as pool:
-        mainfig_list_of_dfs = pool.starmap(heatmap_calc_dfs, [(param_set, param_dict) for param_set in params])
-    
-    list_of_dfs = [df for sublist in mainfig_list_of_dfs for df in sublist]  # Flatten the list
-    df_final = pd.concat(list_of_dfs, ignore_index=True)
+    Args:
+        handle (str): handle of the data, a key of the on-disk store
+        scenario (str): scenario/case to return, all if None
 
-    #make discrete heat map by assigning a "type ID" to each technology
-    dict_type_ID = {"h2": 0, "efuel": 0.25, "comp":0.5, "ccu":0.75, "ccs":1}
-    df_final["type_ID"] = df_final["type"].map(dict_type_ID)
-    return df_final
+    Returns:
+        heatmap_df: df containing the data for the heatmap. It is shared by all requests and must not be modified
+    """
+    df = full_hm_dfs.get((handle, scenario))
+    if df is None:
+        if scenario is None:
+            # e.g. evicted, or computed by another web worker
+            df = store.load(handle)
+            if df is None:
+                raise KeyError(f"no heat map data for the handle {handle}")
+        else:
+            full_hm_df = get_full_hm_df(handle)
+            df = full_hm_df[full_hm_df["scenario"] == scenario]
+        full_hm_dfs.put((handle, scenario), df)
+    return df
 
-def heatmap_calc_dfs(param_set, param_dict):
-    temp_dict = dict(zip(param_dict.keys(), param_set))
-    load_json = True
+def calc_heatmap_data(param_dict: dict):
+    """Compute the data for the heatmap on a grid of parameters
 
-    df_normal = process_full_df.get_df(scenario = "normal", load_json = load_json, **temp_dict)
-    df_ccu = process_full_df.get_df(scenario = "ccu", CCU_coupling=True, DACCS = True, compensate=False, load_json= load_json, **temp_dict)
-    df_comp = process_full_df.get_df(scenario = "comp", CCU_coupling=True, DACCS=False, compensate=True, load_json=load_json, **temp_dict)
+    Args:
+        param_dict (dict): parameter name -> list of values. The axes h2_LCO and co2_LCO are refined near the
+            switches of the options, see landscape.refine_axes
 
+    Returns:
+        heatmap_df: df containing the data for the heatmap
+    """
+    # the results are affine in the h2 and co2 costs, the grid is rasterized from the model fitted for each scenario
+    # and point of the other parameters
+    other_dict = {name: values for name, values in param_dict.items() if name not in landscape.AXES}
+    other_points = engine.param_grid(other_dict)
+    hm_landscapes = [
+        landscape.get_landscape(scenario, **args, **{name: values[i] for name, values in other_points.items()})
+        for i in range(engine.grid_size(other_dict))
+        for scenario, args in SCENARIO_ARGS.items()
+    ]
 
-    return [df_normal, df_ccu, df_comp]
+    # the axes are refined near the switches of the options, the same for all scenarios so that the case can be
+    # switched in the browser
+    axes = landscape.refine_axes(hm_landscapes, *(param_dict[axis] for axis in landscape.AXES))
+    df_final = pd.concat([hm_landscape.rasterize(*axes) for hm_landscape in hm_landscapes], ignore_index=True)
 
+    #make discrete heat map by assigning a "type ID" to each technology
+    df_final["type_ID"] = df_final["type"].map(TYPE_IDS)
+    return df_final
@@ -0,0 +1,225 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from calc import cache
+from src.utils import load_yaml_config_file
+
+
+logger = logging.getLogger(__name__)
+
+# environment variables overriding the level of the metrics logs and the path of the metrics endpoint, see get_config
+METRICS_LOG_LEVEL_ENV = "METRICS_LOG_LEVEL"
+METRICS_ENDPOINT_ENV = "METRICS_ENDPOINT"
+
+# record of the current request or background job, see record
+_current = contextvars.ContextVar("metrics_record", default=None)
+
+_lock = threading.Lock()
+# stage name -> aggregated durations, and counter name -> count, since the start of the process
+_stages = {}
+_counters = Counter()
+# name -> function returning a value for the snapshot (e.g. the number of pending jobs), see register_gauge
+_gauges = {}
+
+
+class Stage:
+    """Duration and row count of a stage, see stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.duration = None
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "duration_s": round(self.duration, 6), "rows": self.rows}
+
+
+@contextmanager
+def stage(name: str, rows: int = None):
+    """Times a stage of a request (e.g. get_basic_LCOPs)
+
+    The duration is added to the totals of the stage and to the record of the current request, if any. The row
+    count can be given or set on the yielded Stage.
+
+    Args:
+        name (str): name of the stage
+        rows (int): number of rows produced by the stage
+
+    Yields:
+        Stage: the stage, its rows can be set
+    """
+    current = Stage(name)
+    current.rows = rows
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - start
+        with _lock:
+            totals = _stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            totals["count"] += 1
+            totals["total_s"] += current.duration
+            totals["max_s"] = max(totals["max_s"], current.duration)
+        request_record = _current.get()
+        if request_record is not None:
+            request_record["stages"].append(current)
+
+
+def increment(name: str, n: int = 1):
+    """Adds n to a counter (e.g. the number of pool tasks)"""
+    with _lock:
+        _counters[name] += n
+
+
+def register_gauge(name: str, func):
+    """Adds a value computed when the snapshot is taken (func is called without arguments)"""
+    _gauges[name] = func
+
+
+def start_record(kind: str, **fields):
+    """Starts the record of a request or background job in the current context, see record
+
+    Returns:
+        contextvars.Token: passed to finish_record
+    """
+    return _current.set({
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        **fields,
+        "start": time.perf_counter(),
+        "stages": [],
+        "cache": _cache_totals(),
+    })
+
+
+def finish_record(token, **fields):
+    """Finishes the record started with token, and logs it as one JSON line
+
+    Returns:
+        dict: the record
+    """
+    request_record = _current.get()
+    try:
+        _current.reset(token)
+    except ValueError:
+        # the record was started in another context
+        _current.set(None)
+    if request_record is None:
+        return None
+
+    cache_before = request_record.pop("cache")
+    cache_after = _cache_totals()
+    request_record.update(fields)
+    request_record["duration_s"] = round(time.perf_counter() - request_record.pop("start"), 6)
+    request_record["stages"] = [s.as_dict() for s in request_record["stages"]]
+    # process wide, includes the cache accesses of concurrent requests
+    request_record["cache"] = {k: cache_after[k] - cache_before[k] for k in cache_after}
+    logger.info(json.dumps(request_record, default=str))
+    return request_record
+
+
+@contextmanager
+def record(kind: str, **fields):
+    """Records the stages of a request or background job (e.g. a heat map recalculation) and logs them"""
+    token = start_record(kind, **fields)
+    try:
+        yield
+    finally:
+        finish_record(token)
+
+
+def snapshot() -> dict:
+    """Returns the aggregated stage durations, the counters, the cache statistics and the gauges"""
+    with _lock:
+        stages = {
+            name: dict(totals, mean_s=totals["total_s"] / totals["count"])
+            for name, totals in _stages.items()
+        }
+        counters = dict(_counters)
+    gauges = {}
+    for name, func in list(_gauges.items()):
+        try:
+            gauges[name] = func()
+        except Exception as e:
+            gauges[name] = f"error: {e}"
+    return {
+        "pid": os.getpid(),
+        "stages": stages,
+        "counters": counters,
+        "caches": cache.get_stats(),
+        "gauges": gauges,
+    }
+
+
+def reset():
+    """Resets the stage durations and the counters"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def get_config() -> dict:
+    """The level of the metrics logs and the path of the metrics endpoint (None for no endpoint)
+
+    Set in the metrics entry of config/global.yml, and overridden by the METRICS_LOG_LEVEL and METRICS_ENDPOINT
+    environment variables.
+    """
+    config = {"log_level": "INFO", "endpoint": None}
+    config.update(load_yaml_config_file("global").get("metrics") or {})
+    if METRICS_LOG_LEVEL_ENV in os.environ:
+        config["log_level"] = os.environ[METRICS_LOG_LEVEL_ENV]
+    if METRICS_ENDPOINT_ENV in os.environ:
+        config["endpoint"] = os.environ[METRICS_ENDPOINT_ENV]
+    return config
+
+
+def init_app(flask_app, endpoint: str = None):
+    """Records the callback requests (POST) of the Flask app (see record), and adds the metrics endpoint
+
+    The records are logged at the level of the config (see get_config). If the logger of this module has no
+    handler, one writing the JSON lines to stderr is added, so that the records are not dropped by the default
+    WARNING level of the root logger.
+
+    Args:
+        flask_app (flask.Flask): the app, e.g. webapp.flask_app
+        endpoint (str): path of the endpoint returning snapshot() as JSON, by default the one of the config. No
+            endpoint if None
+    """
+    from flask import g, jsonify, request
+
+    config = get_config()
+    logger.setLevel(str(config["log_level"]).upper())
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        # the records are written by the handler of this logger only, not again by handlers of the root logger
+        logger.propagate = False
+
+    @flask_app.before_request
+    def _start_request_record():
+        if request.method == "POST":
+            body = request.get_json(silent=True) or {}
+            g.metrics_token = start_record("request", path=request.path, callback=body.get("output"))
+
+    @flask_app.teardown_request
+    def _finish_request_record(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            finish_record(token, error=None if exc is None else repr(exc))
+
+    endpoint = endpoint or config["endpoint"]
+    if endpoint:
+        flask_app.add_url_rule(endpoint, "metrics", lambda: jsonify(snapshot()))
+
+
+def _cache_totals():
+    stats = cache.get_stats().values()
+    return {"hits": sum(s["hits"] for s in stats), "misses": sum(s["misses"] for s in stats)}
@@ -1,3 +1,5 @@
+import functools
+import json
 from abc import ABC
 from string import ascii_lowercase
 from typing import Optional, Final
@@ -7,13 +9,69 @@ from plotly.colors import hex_to_rgb
 
 from piw import AbstractPlot
 
+from calc import cache
+from calc.context import params_stamp
+from src import metrics
+
 
 inch_per_pt: Final[float] = 1 / 72
 
+# figures returned by the plot methods, serialised, see cached_figures
+figures = cache.LRUCache(maxsize=64, name="figures")
+
+
+def cached_figures(plot):
+    """Decorator caching the figures returned by a plot method, keyed by plot class, relevant inputs (see
+    BasePlot._cache_key), target (webapp or print), subfigures and the stamp of the params file (see
+    calc.context.params_stamp), so that the figures are not served stale after the file changed
+
+    The figures are stored as JSON and rebuilt without validation on a hit, so that neither the figures nor the
+    cached entries are shared between requests. _decorate is applied to the rebuilt figures.
+    """
+    @functools.wraps(plot)
+    def wrapper(self, inputs: dict, outputs: dict, subfig_names: list) -> dict:
+        with metrics.stage(f"{type(self).__name__}.plot"):
+            return _cached_plot(self, inputs, outputs, subfig_names)
+
+    def _cached_plot(self, inputs, outputs, subfig_names):
+        key = self._cache_key(inputs, outputs)
+        if key is None:
+            return plot(self, inputs, outputs, subfig_names)
+        key = (type(self).__name__, key, self._target, tuple(subfig_names), params_stamp({}))
+
+        entry = figures.get(key)
+        if entry is None:
+            subfigs = plot(self, inputs, outputs, subfig_names)
+            figures.put(key, {
+                subfig_name: None if fig is None else (fig.to_json(), fig._grid_ref, fig._grid_str)
+                for subfig_name, fig in subfigs.items()
+            })
+            return subfigs
+
+        subfigs = {}
+        for subfig_name, fig_entry in entry.items():
+            if fig_entry is None:
+                subfigs[subfig_name] = None
+                continue
+            fig_json, grid_ref, grid_str = fig_entry
+            # the subplot grid of make_subplots is not part of the JSON
+            fig_dict = dict(json.loads(fig_json), _grid_ref=grid_ref, _grid_str=grid_str)
+            subfigs[subfig_name] = go.Figure(fig_dict, _validate=False)
+        return subfigs
+
+    return wrapper
+
 
 class BasePlot(AbstractPlot, ABC):
     _add_subfig_name: bool = False
     _add_subfig_name_dict: Optional[dict] = None
+    # inputs the figures depend on (besides the outputs computed from them), see _cache_key
+    _cache_inputs: tuple = ()
+
+    def _cache_key(self, inputs: dict, outputs: dict):
+        """Key of the figures in the figure cache (see cached_figures), None if they are not cached. The outputs are
+        computed from the inputs, so by default the key is made of the _cache_inputs"""
+        return cache.canonical_key({name: inputs[name] for name in self._cache_inputs})
 
     def _decorate(self, inputs: dict, outputs: dict, subfigs: dict):
         for subfig_name, subfig_plot in subfigs.items():
@@ -3,14 +3,17 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
-from src.plots.BasePlot import BasePlot
+from src.plots.BasePlot import BasePlot, cached_figures
 from src.utils import load_yaml_plot_config_file
 
 
 class FuelStackedBarPlot(BasePlot):
     figs, cfg = load_yaml_plot_config_file('FuelStackedBarPlot')
     _add_subfig_name = True
+    # the basic LCOPs (see proc.get_basic_LCOPs) are calculated from these inputs
+    _cache_inputs = ('params', 'ccu_attribution_simple', 'steel_capex_simple')
 
+    @cached_figures
     def plot(self, inputs: dict, outputs: dict, subfig_names: list) -> dict:
         tech_displayname = pd.Series(outputs['full_df']["code"].values, index = outputs['full_df']["tech"]).to_dict()
         df_fuels = outputs['df_fuels']
@@ -3,7 +3,9 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
-from src.plots.BasePlot import BasePlot
+from src.cube import MISSING_CODE
+from src.plots.BasePlot import BasePlot, cached_figures
+from src.plots.encoding import encode_typed_arrays, log_payload_size
 from src.utils import load_yaml_plot_config_file
 
 import numpy as np
@@ -11,14 +13,67 @@ import numpy as np
 class HeatMapPlot(BasePlot):
     figs, cfg = load_yaml_plot_config_file('HeatMapPlot')
 
+    @cached_figures
     def plot(self, inputs: dict, outputs: dict, subfig_names: list) -> dict:
 
-        df = outputs['heatmap_df']
-        contour_df = outputs['contour_df']
-        hm_transparency_df = outputs['hm_transparency_df']
-        optioninfo_df = outputs['optioninfo_df']
+        hm_cube = outputs['hm_cube']
+        #json: plain arrays, option descriptions as customdata; typed: typed arrays, see _add_hover_layers
+        encoding = self.cfg.get('encoding', 'json')
 
-        case_label = self._glob_cfg['case'][inputs['selected_case']]['label']
+        #the heat map data is recalculated in the background, the default data is shown until it finished
+        hm_job = outputs.get('hm_job')
+        case_label = self.case_label(inputs['selected_case'], self._glob_cfg, hm_job)
+
+        fig = self._make_fig(hm_cube, inputs['selected_case'], self._glob_cfg, case_label)
+        #the case is switched in the browser while the default heat maps are shown, see client_cases, and the
+        #recalculation (job id) is polled until it finished, see the toggle_hm_poll clientside callback in ctrls
+        fig.update_layout(meta={'hm_default': bool(outputs.get('hm_default', False)),
+                                'hm_job': hm_job['id'] if hm_job is not None else None})
+
+        if encoding == 'typed':
+            fig = encode_typed_arrays(fig)
+        log_payload_size('HeatMapPlot', fig, encoding)
+
+        return {'fig4': fig}
+
+    def _cache_key(self, inputs: dict, outputs: dict):
+        #the heat map data is identified by outputs['hm_key'], the heat maps are not cached while it is recalculated
+        if outputs.get('hm_key') is None:
+            return None
+        return outputs['hm_key'], inputs['selected_case']
+
+    @classmethod
+    def case_label(cls, selected_case: str, glob_cfg: dict, hm_job: dict = None) -> str:
+        """Label of the case in the title, with the status of the recalculation (see jobs.Job.progress) if it runs"""
+        case_label = glob_cfg['case'][selected_case]['label']
+        if hm_job is not None:
+            case_label += cls.cfg['updating_label'].format(**hm_job)
+        return case_label
+
+    @classmethod
+    def client_cases(cls, hm_cube, glob_cfg: dict) -> dict:
+        """Traces and title of the heat maps of every case, switched in the browser by the switch_hm_case clientside
+        callback in ctrls
+
+        Args:
+            hm_cube (HeatMapCube): the heat map data of all the cases, with the default parameters
+            glob_cfg (dict): the global config
+
+        Returns:
+            dict: traces (case -> list of trace dicts, typed arrays in the typed encoding) and titles (case -> title)
+        """
+        cases = {'traces': {}, 'titles': {}}
+        for case in hm_cube.scenarios:
+            fig = cls._make_fig(hm_cube, case, glob_cfg, cls.case_label(case, glob_cfg))
+            if cls.cfg.get('encoding', 'json') == 'typed':
+                fig = encode_typed_arrays(fig)
+            cases['traces'][case] = fig.to_dict()['data']
+            cases['titles'][case] = fig.layout.title.text
+        return cases
+
+    @classmethod
+    def _make_fig(cls, hm_cube, selected_case: str, glob_cfg: dict, case_label: str) -> go.Figure:
+        encoding = cls.cfg.get('encoding', 'json')
 
         #get unique sectors
         unique_sectors = ["chem", "plane", "ship", "steel", "cement"]
@@ -26,25 +81,25 @@ class HeatMapPlot(BasePlot):
         #create subplot
         cols = len(unique_sectors)
         fig = make_subplots(rows=1, cols=cols, 
-                            x_title=self.cfg['xaxis_title'],
-                            subplot_titles=[f"{self._glob_cfg['sector'][sector]['label']}" for sector in unique_sectors])
+                            x_title=cls.cfg['xaxis_title'],
+                            subplot_titles=[f"{glob_cfg['sector'][sector]['label']}" for sector in unique_sectors])
 
 
         #fig = go.Figure()
-        custom_cmap = self._make_cmap()
+        custom_cmap = cls._make_cmap()
         cmap_labels = ["H2/NH3", "Synfuel", "Compensation", "CCU", "CCS"]
 
         for i, sector in enumerate(unique_sectors, start=1):
 
-            #extract the sector data
-            sector_df = df.xs(sector, level="sector")
-            sector_contour_df = contour_df.xs(sector, level="sector")
-            sector_transparency_df = hm_transparency_df.xs(sector, level="sector")
-            sector_optioninfo_df = optioninfo_df.xs(sector, level="sector")
+            #extract the sector data, (h2 x co2) matrices
+            sector_data = hm_cube.matrices(selected_case, sector)
 
-            x_values = sector_df.columns
-            y_values = sector_df.index
-            z_values = sector_df.values
+            x_values = hm_cube.co2_LCO
+            y_values = hm_cube.h2_LCO
+            z_values = sector_data['type_ID']
+            if encoding == 'typed':
+                #the colour values (multiples of 0.25) are exact in float32
+                z_values = z_values.astype(np.float32)
 
 
 
@@ -58,7 +113,7 @@ class HeatMapPlot(BasePlot):
                     colorscale=custom_cmap,
                     showscale=(i == cols),
                     colorbar = dict(
-                        title=self.cfg['colorbar_title'],
+                        title=cls.cfg['colorbar_title'],
                         tickvals=[0.1, 0.3, 0.5, 0.7, 0.9],
                         ticktext=cmap_labels,
                         x = 0.5,
@@ -69,7 +124,9 @@ class HeatMapPlot(BasePlot):
                 ),
                 row = 1, col = i
             )
-            fig = self._add_contours(fig, sector_contour_df, z_values=sector_optioninfo_df.values, row = 1, col = i)
+            option_labels = None if encoding == 'typed' else hm_cube.labels(sector_data['code_id'])
+            fig = cls._add_contours(fig, sector_data['fscp'], x_values, y_values,
+                                    z_values=option_labels, row = 1, col = i)
 
             tr_colorscale = [
                 [0.0, "rgba(250, 250, 250, 1.0)"],
@@ -78,9 +135,9 @@ class HeatMapPlot(BasePlot):
 
             fig.add_trace(
                 go.Heatmap(
-                    z=sector_transparency_df.values,
-                    x=sector_transparency_df.columns,
-                    y=sector_transparency_df.index,
+                    z=sector_data['delta_fscp'],
+                    x=x_values,
+                    y=y_values,
                     colorscale=tr_colorscale,
                     zmin = 0,
                     zmax=100,
@@ -90,6 +147,10 @@ class HeatMapPlot(BasePlot):
                 row= 1, col = i
             )
 
+            if encoding == 'typed':
+                fig = cls._add_hover_layers(fig, sector_data['fscp'], sector_data['code_id'], hm_cube.code_table,
+                                            x_values, y_values, row = 1, col = i)
+
             if i > 1:
                 fig.update_yaxes(showticklabels=False, row=1, col=i)
                 
@@ -97,9 +158,9 @@ class HeatMapPlot(BasePlot):
         fig.update_xaxes(tickfont=dict(size=8))
         fig.update_layout(
         margin=dict(l=50, r=10, t=100, b=50),
-        title=self.cfg['title']+case_label,
-        yaxis_title=self.cfg['yaxis_title'],
-        #xaxis_title=self.cfg['xaxis_title'],
+        title=cls.cfg['title']+case_label,
+        yaxis_title=cls.cfg['yaxis_title'],
+        #xaxis_title=cls.cfg['xaxis_title'],
         legend_title='',
         legend=dict(
             yanchor="bottom",
@@ -110,9 +171,10 @@ class HeatMapPlot(BasePlot):
         )
         )
 
-        return {'fig4': fig}
+        return fig
 
-    def _make_cmap(self):
+    @staticmethod
+    def _make_cmap():
         """Required to make a custom and DISCRETE colormap
 
         Returns:
@@ -127,13 +189,14 @@ class HeatMapPlot(BasePlot):
         
         return custom_colorscale
 
-    def _add_contours(self, fig, contour_df, z_values, row, col):
+    @classmethod
+    def _add_contours(cls, fig, contour_values, x_values, y_values, z_values, row, col):
         #contours
         fig.add_trace(
             go.Contour(
-                z=contour_df.values,
-                x=contour_df.columns,
-                y=contour_df.index,
+                z=contour_values,
+                x=x_values,
+                y=y_values,
                 contours_coloring='lines',
                 colorscale=[
                     [0.0, '#000000'],
@@ -145,14 +208,46 @@ class HeatMapPlot(BasePlot):
                     showlabels=True,
                 ),
                 showscale=False,
-                hoverinfo="text",
-                hovertemplate="<b>Non-fossil CO<sub>2</sub> cost:</b>: €%{x}/tCO<sub>2</sub><br>"
-                      "<b>Low-emission H<sub>2</sub> cost</b>: €%{y}/MWh<br>"
-                      #"<b>Abatement cost</b>: €%{z:.2f}/tCO2<extra></extra>"
-                      "<b>Abatement cost</b>: €%{z:.2f}/tCO2<br>"
-                      "<b>Abatement option</b>: %{customdata}<extra></extra>",
+                hoverinfo="text" if z_values is not None else "skip",
+                hovertemplate=cls._hovertemplate("%{customdata}") if z_values is not None else None,
                 customdata=z_values,
             ),
             row = row, col = col
         )
         return fig
+
+    @classmethod
+    def _add_hover_layers(cls, fig, contour_values, code_ids, code_table, x_values, y_values, row, col):
+        """Adds one transparent heat map per option, showing the hover of the points where it is selected
+
+        Replaces the hover of the contours (the description of each point as customdata, which makes up most of
+        the payload): the description is looked up in the table of codes once per option and written in the hover
+        template of its layer. The layers only carry the FSCPs, as typed arrays, on the bounding box of the points
+        of their option (with a margin of one point, so that the cells keep the width of the grid).
+        """
+        for code_id in np.unique(code_ids[code_ids != MISSING_CODE]):
+            selected = code_ids == code_id
+            rows, cols = np.flatnonzero(selected.any(axis=1)), np.flatnonzero(selected.any(axis=0))
+            rows = slice(max(rows[0] - 1, 0), rows[-1] + 2)
+            cols = slice(max(cols[0] - 1, 0), cols[-1] + 2)
+            fig.add_trace(
+                go.Heatmap(
+                    z=np.where(selected, contour_values, np.nan)[rows, cols].astype(np.float32),
+                    x=x_values[cols],
+                    y=y_values[rows],
+                    opacity=0,
+                    showscale=False,
+                    hoverongaps=False,
+                    hovertemplate=cls._hovertemplate(code_table[code_id].replace('%', '&#37;')),
+                ),
+                row = row, col = col
+            )
+        return fig
+
+    @staticmethod
+    def _hovertemplate(option: str):
+        return ("<b>Non-fossil CO<sub>2</sub> cost:</b>: €%{x}/tCO<sub>2</sub><br>"
+                "<b>Low-emission H<sub>2</sub> cost</b>: €%{y}/MWh<br>"
+                #"<b>Abatement cost</b>: €%{z:.2f}/tCO2<extra></extra>"
+                "<b>Abatement cost</b>: €%{z:.2f}/tCO2<br>"
+                f"<b>Abatement option</b>: {option}<extra></extra>")
@@ -0,0 +1,75 @@
+import base64
+import logging
+
+import numpy as np
+import plotly.graph_objects as go
+
+
+logger = logging.getLogger(__name__)
+
+# encodings of the numeric arrays of the figures: plain JSON lists, or base64 typed arrays (plotly.js >= 2.28)
+ENCODINGS = ("json", "typed")
+# typed array dtypes supported by plotly.js
+TYPED_DTYPES = {
+    np.dtype(np.int8): "i1", np.dtype(np.uint8): "u1",
+    np.dtype(np.int16): "i2", np.dtype(np.uint16): "u2",
+    np.dtype(np.int32): "i4", np.dtype(np.uint32): "u4",
+    np.dtype(np.float32): "f4", np.dtype(np.float64): "f8",
+}
+# trace properties that are encoded
+TYPED_KEYS = ("x", "y", "z", "customdata")
+
+
+def typed_array(values) -> dict:
+    """Returns a numeric array as a plotly.js typed array spec
+
+    int64 values are sent as int32 and other dtypes as float64, as plotly.js has no 64-bit integer arrays.
+
+    Args:
+        values (array-like): 1-D or 2-D numeric array
+
+    Returns:
+        dict: dtype, bdata (the base64 encoded bytes) and, for 2-D arrays, shape
+    """
+    values = np.asarray(values)
+    if values.dtype not in TYPED_DTYPES:
+        values = values.astype(np.int32 if values.dtype.kind in "iu" else np.float64)
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+    spec = {"dtype": TYPED_DTYPES[values.dtype], "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
+    if values.ndim > 1:
+        spec["shape"] = ", ".join(str(n) for n in values.shape)
+    return spec
+
+
+def encode_typed_arrays(fig: go.Figure, keys=TYPED_KEYS) -> go.Figure:
+    """Returns a figure with the numeric arrays of the traces replaced by typed arrays
+
+    The plotly.py validators do not accept typed array specs, so they are set in the dict of the figure, which is
+    then loaded without validation (with its subplot grid, as in BasePlot.cached_figures). The returned figure can
+    still be updated and serialised, but not copied with go.Figure(fig).
+
+    Args:
+        fig (go.Figure): the figure, not modified
+        keys (tuple): the trace properties to encode, if they are numeric arrays
+
+    Returns:
+        go.Figure: the figure with typed arrays
+    """
+    fig_dict = fig.to_dict()
+    for trace in fig_dict["data"]:
+        for key in keys:
+            values = trace.get(key)
+            if isinstance(values, (np.ndarray, list, tuple)) and np.asarray(values).dtype.kind in "iuf":
+                trace[key] = typed_array(values)
+    return go.Figure(dict(fig_dict, _grid_ref=fig._grid_ref, _grid_str=fig._grid_str), _validate=False)
+
+
+def payload_size(fig: go.Figure) -> int:
+    """Returns the size in bytes of the figure as sent to the browser"""
+    return len(fig.to_json().encode("utf-8"))
+
+
+def log_payload_size(name: str, fig: go.Figure, encoding: str):
+    """Logs the payload size of a figure, if info logging is enabled (serialising the figure takes time)"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s payload: %d bytes (%s encoding)", name, payload_size(fig), encoding)
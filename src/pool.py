@@ -0,0 +1,114 @@
+import collections
+import multiprocessing as mp
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from calc import engine
+from src import metrics
+
+
+# number of worker processes
+N_WORKERS = mp.cpu_count()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the process pool, starting it on first use. The workers are kept alive between requests
+
+    Returns:
+        ProcessPoolExecutor: the process pool
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=N_WORKERS,
+                initializer=_init_worker,
+                initargs=(engine.DEFAULT_PARAMS_PATH,),
+            )
+        return _executor
+
+
+def shutdown():
+    """Stops the process pool. It is started again on the next use"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def imap_grid(func, param_dict: dict, chunk_size: int, skip=(), **kwargs):
+    """Evaluates func on a grid of parameters too large to hold all the results in memory: the grid is split into
+    chunks of chunk_size points spread over the worker processes, and the results are yielded one chunk at a time,
+    in the order of the points
+
+    Only the parameter values (param_dict) and the bounds of each chunk are sent to the workers, the params file is
+    parsed once per worker when it starts. At most two chunks per worker are submitted ahead of the chunk being
+    yielded, so that the results waiting to be consumed stay bounded.
+
+    Args:
+        func (callable): module level function taking a dict of points (see engine.param_grid) and kwargs
+        param_dict (dict): parameter name -> list of values, as passed to engine.param_grid
+        chunk_size (int): number of points per chunk
+        skip (collection): indices of the chunks not evaluated (e.g. done in a previous run)
+        **kwargs: passed on to func
+
+    Yields:
+        tuple: index of the chunk and result of func
+    """
+    n_points = engine.grid_size(param_dict)
+    tasks = (
+        (index, (func, param_dict, start, min(start + chunk_size, n_points), kwargs))
+        for index, start in enumerate(range(0, n_points, chunk_size))
+        if index not in skip
+    )
+    max_pending = N_WORKERS * 2
+    # (index, task, future) of the submitted chunks, in order
+    pending = collections.deque()
+    restarted = False
+    while True:
+        while len(pending) < max_pending:
+            index, task = next(tasks, (None, None))
+            if task is None:
+                break
+            metrics.increment("pool_tasks")
+            pending.append((index, task, get_executor().submit(_run_chunk, *task)))
+        if not pending:
+            return
+
+        index, task, future = pending[0]
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            if restarted:
+                raise
+            # a worker died (e.g. killed by the os), start a new pool and submit the pending chunks once more
+            restarted = True
+            metrics.increment("pool_restarts")
+            _reset()
+            executor = get_executor()
+            pending = collections.deque((i, t, executor.submit(_run_chunk, *t)) for i, t, _ in pending)
+            continue
+        pending.popleft()
+        yield index, result
+
+
+def _reset():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _init_worker(path_to_params):
+    # parse the params file once per worker
+    engine.get_engine(path_to_params)
+
+
+def _run_chunk(func, param_dict, start, end, kwargs):
+    return func(engine.param_grid_chunk(param_dict, start, end), **kwargs)
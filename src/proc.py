@@ -1,69 +1,113 @@
 import pandas as pd
 import numpy as np
-import matplotlib
-import multiprocessing as mp
-import itertools
 
 import calc.calc_costs as calc_costs
-from calc.calc_costs import calc_LCO_breakdown, calc_all_LCO_wbreakdown, breakdown_LCO_comps
-from calc import process_full_df
+from calc.calc_costs import calc_all_LCO_wbreakdown, breakdown_LCO_comps
+from calc import cache
+from calc.process_full_df import SCENARIO_ARGS
+from calc import landscape
 from . import load
+from . import jobs
+from . import metrics
+from . import profiling
+from . import session
+from .cube import HeatMapCube
+
+
+def new_session_state():
+    """Initial state of a user session: the previous inputs (initiated with the same parameters as load.py), and the
+    handle (job key, see hm_jobs) of the last recalculated heat map"""
+    return {
+        'previous_inputs': {
+            'co2ts_LCO': load.CO2TS_LCO_DEFAULT,
+            'ccu_attribution': load.CCU_ATTR_DEFAULT,
+            'steel_capex': load.STEEL_CAPEX_DEFAULT,
+        },
+        'hm_handle': None,
+    }
+
+# state of the user sessions, so that users interleaving requests on the same worker do not share their previous inputs
+sessions = session.SessionStore(factory=new_session_state)
+
 
+# the heat map recalculations run in the background. The callback waits HM_JOB_WAIT seconds for them, and shows
+# the progress if they did not finish. The job is then polled (see ctrls.poll_hm_job), and the heat maps are
+# regenerated when it finished (heatmap-ready)
+hm_jobs = jobs.JobManager(max_workers=2)
+HM_JOB_WAIT = 2.0
+HM_TRIGGERS = ("heatmap-update.n_clicks", "heatmap-ready.data")
+# inputs the heat map recalculation depends on
+HM_INPUTS = ("co2ts-LCO-hm", "ccu_attribution", "selected_case", "steel_capex")
 
-#initiate with same parameters as load.py
-previous_inputs = {'h2_LCO': load.H2_LCO_DEFAULT,
-        'co2_LCO': load.CO2_LCO_DEFAULT,
-        'co2ts_LCO': load.CO2TS_LCO_DEFAULT}
+metrics.register_gauge("hm_jobs_pending", lambda: len(hm_jobs.pending()))
+metrics.register_gauge("sessions", lambda: len(sessions))
 
 # process inputs into outputs
 def process_inputs(inputs: dict, outputs: dict):
-    #define global variable
-    global previous_inputs
+    with metrics.stage("process_inputs"), profiling.sampled("process_inputs", trigger_id=inputs.get('trigger_id')):
+        _process_inputs(inputs, outputs)
+
+def _process_inputs(inputs: dict, outputs: dict):
+    #state of the user session (requests without session id share one state)
+    state = sessions.get(inputs.get('session_id'))
+    previous_inputs = state['previous_inputs']
 
     #calculate basic abatement cost annd breakdowns
-    full_df, LCO_breakdown = get_basic_LCOPs(inputs)
+    with metrics.stage("get_basic_LCOPs") as stage:
+        full_df, LCO_breakdown = get_basic_LCOPs(inputs)
+        stage.rows = len(full_df)
 
     # basic LCOs and breakdown
     outputs['full_df'] = full_df
     outputs['full_df_breakdown'] = LCO_breakdown
     #advanced breakdown for the sectors and fuels
-    outputs['df_sectors'], outputs['df_fuels'] = breakdown_LCO_comps(LCO_breakdown)
+    with metrics.stage("breakdown_LCO_comps") as stage:
+        outputs['df_sectors'], outputs['df_fuels'] = breakdown_LCO_comps(LCO_breakdown)
+        stage.rows = len(outputs['df_sectors']) + len(outputs['df_fuels'])
 
     # Load inputs
-    full_hm_df = inputs['full_hm_df']
+    full_hm_handle = inputs['full_hm_handle']
     selected_case = inputs["selected_case"]
 
     # filter the full hm df. 
     # If the co2 transport and storage cost, steel capex, or ccu attribution have been changed, the heat map data is updated
-    # only valid if the hm update button has been pressed
-    if inputs['trigger_id'] != "heatmap-update.n_clicks":
-        df_final = full_hm_df[full_hm_df["scenario"] == selected_case]
+    # only valid if the hm update button has been pressed (or the recalculation is still running)
+    outputs['hm_job'] = None
+    if inputs['trigger_id'] not in HM_TRIGGERS:
+        # the heat map the user recalculated last is kept, as long as the heat map inputs did not change
+        job = hm_jobs.find(state['hm_handle']) if state['hm_handle'] == get_hm_job_key(inputs) else None
+        if job is not None and job.status == jobs.DONE:
+            hm_cube = job.result()
+        else:
+            hm_cube = load.get_full_hm_cube(full_hm_handle)
     else:
+        state['hm_handle'] = None
         if inputs['co2ts-LCO-hm'] != previous_inputs['co2ts_LCO'] or inputs['co2ts-LCO-hm'] != load.CO2TS_LCO_DEFAULT:
-            new_hm_df = recalc_hm_df(inputs)
-            df_final = new_hm_df
+            hm_cube = get_recalc_hm_cube(inputs, outputs)
+            state['hm_handle'] = get_hm_job_key(inputs)
         #also check case where only ccu attribution has been changed, and not co2ts
         elif inputs['ccu_attribution'] != previous_inputs['ccu_attribution'] or inputs['ccu_attribution'] != load.CCU_ATTR_DEFAULT:
-            new_hm_df = recalc_hm_df(inputs)
-            df_final = new_hm_df
+            hm_cube = get_recalc_hm_cube(inputs, outputs)
+            state['hm_handle'] = get_hm_job_key(inputs)
         elif set(inputs['steel_capex']) != set(previous_inputs['steel_capex']) or inputs['steel_capex'] != load.STEEL_CAPEX_DEFAULT:
-            new_hm_df = recalc_hm_df(inputs)
-            df_final = new_hm_df
+            hm_cube = get_recalc_hm_cube(inputs, outputs)
+            state['hm_handle'] = get_hm_job_key(inputs)
         else:
-            df_final = full_hm_df[full_hm_df["scenario"] == selected_case]
+            hm_cube = load.get_full_hm_cube(full_hm_handle)
    
 
-    #take the 4 different dfs needed
-    heatmap_df = df_final.pivot(index=["sector", "h2_LCO"], columns="co2_LCO", values="type_ID")
-    contour_df = df_final.pivot(index=["sector", "h2_LCO"], columns="co2_LCO", values="fscp")
-    hm_transparency_df = df_final.pivot(index=["sector", "h2_LCO"], columns="co2_LCO", values="delta_fscp")
-    optioninfo_df = df_final.pivot(index=["sector", "h2_LCO"], columns="co2_LCO", values="code")
-
-    #heatmap data to outputs
-    outputs['heatmap_df'] = heatmap_df
-    outputs['contour_df'] = contour_df
-    outputs['hm_transparency_df'] = hm_transparency_df
-    outputs['optioninfo_df'] = optioninfo_df
+    #heatmap data to outputs, the plot takes the matrices of each sector from the cube
+    outputs['hm_cube'] = hm_cube
+    #whether the default heat maps are shown, the case can then be switched in the browser (see the switch_hm_case clientside
+    #callback in ctrls)
+    outputs['hm_default'] = hm_cube is load.get_full_hm_cube(full_hm_handle) and outputs['hm_job'] is None
+    #key of the heat map data (None while it is recalculated), the heat maps are cached by it (see BasePlot.cached_figures)
+    if outputs['hm_job'] is not None:
+        outputs['hm_key'] = None
+    elif outputs['hm_default']:
+        outputs['hm_key'] = ('default', full_hm_handle)
+    else:
+        outputs['hm_key'] = get_hm_job_key(inputs)
 
     #save inputs
     previous_inputs['co2ts_LCO'] = inputs['co2ts-LCO-hm']
@@ -71,12 +115,60 @@ def process_inputs(inputs: dict, outputs: dict):
     previous_inputs['steel_capex'] = inputs['steel_capex']
 
 
+def get_recalc_hm_cube(inputs: dict, outputs: dict):
+    """Recalculates the heatmap data in the background (see hm_jobs), identical recalculations of several users run once
+
+    Args:
+        inputs (dict): Input parameters determined by the user
+        outputs (dict): Outputs, the status and progress of the recalculation are added as hm_job if it did not finish
+
+    Returns:
+        HeatMapCube: the updated data for the heatmap if the recalculation finished, the data of the default
+            parameters otherwise
+    """
+    job = hm_jobs.submit(get_hm_job_key(inputs), recalc_hm_cube, {k: inputs[k] for k in HM_INPUTS})
+    if job.wait(HM_JOB_WAIT):
+        return job.result()
+
+    outputs['hm_job'] = job.progress()
+    return load.get_full_hm_cube(inputs['full_hm_handle'])
+
+def get_hm_job_key(inputs: dict):
+    """Key of a heat map recalculation, see hm_jobs
+
+    Args:
+        inputs (dict): Input parameters determined by the user, at least HM_INPUTS
+
+    Returns:
+        tuple: the key
+    """
+    return ("heatmap", cache.canonical_key({k: inputs[k] for k in HM_INPUTS}))
 
-def recalc_hm_df(inputs:dict):
+def recalc_hm_cube(inputs: dict, progress=None):
+    """Recalculates the heatmap data (see recalc_hm_df) as a HeatMapCube
+
+    Args:
+        inputs (dict): Input parameters determined by the user
+        progress (callable): see recalc_hm_df
+
+    Returns:
+        HeatMapCube: the updated data for the heatmap
+    """
+    with metrics.record("heatmap_job", selected_case=inputs["selected_case"]), \
+            profiling.sampled("heatmap_job", selected_case=inputs["selected_case"]):
+        with metrics.stage("recalc_hm_df") as stage:
+            df = recalc_hm_df(inputs, progress=progress)
+            stage.rows = len(df)
+        with metrics.stage("HeatMapCube.from_df", rows=len(df)):
+            return HeatMapCube.from_df(df)
+
+def recalc_hm_df(inputs:dict, progress=None):
     """Recalculates hm_df based on new co2 transport and storage cost given
 
     Args:
         inputs (dict): Input parameters determined by the user
+        progress (callable): called with the number of steps done, the number of steps and a label once the data
+            is computed (see jobs.Job.set_progress)
     
     Returns;
         full_hm_df: df containing the updated data for the heatmap
@@ -92,8 +184,7 @@ def recalc_hm_df(inputs:dict):
     dri_eaf_capex = inputs['steel_capex'][2]
 
     param_dict = {
-        "h2_LCO": np.arange(0, 245, 5),  # used to be 2
-        "co2_LCO": np.arange(0, 1250, 50),  # used to be 25
+        **load.get_heatmap_axes(),
         "co2ts_LCO": [selected_co2ts_LCO],
         "co2ccu_co2em": [selected_ccu_attr],
         "fossil_steel_capex": [bf_bof_capex],
@@ -103,45 +194,22 @@ def recalc_hm_df(inputs:dict):
         "h2_steel_capex": [dri_eaf_capex],
     }
 
-    params = itertools.product(*param_dict.values())
-
-    with mp.Pool(mp.cpu_count()) as pool:
-        list_of_dfs = pool.starmap(heatmap_recalc_dfs, [(param_set, param_dict, selected_case) for param_set in params])
-    
-    df_final = pd.concat(list_of_dfs, ignore_index=True)
+    # the results are affine in the h2 and co2 costs, the grid is rasterized from the model fitted for the other
+    # parameters. The options are selected over all sectors at once, the sectors are not independent (see
+    # process_full_df.select_options_grid)
+    other_params = {name: np.asarray(values)[0] for name, values in param_dict.items() if name not in landscape.AXES}
+    hm_landscape = landscape.get_landscape(selected_case, **SCENARIO_ARGS[selected_case], **other_params)
+    # the axes are refined near the switches of the options
+    axes = landscape.refine_axes([hm_landscape], *(param_dict[axis] for axis in landscape.AXES))
+    df_final = hm_landscape.rasterize(*axes)
+    if progress is not None:
+        progress(1, 1, selected_case)
 
     #make discrete heat map by assigning a "type ID" to each technology
-    dict_type_ID = {"h2": 0, "efuel": 0.25, "comp":0.5, "ccu":0.75, "ccs":1}
-    df_final["type_ID"] = df_final["type"].map(dict_type_ID)
+    df_final["type_ID"] = df_final["type"].map(load.TYPE_IDS)
 
     return df_final
     
-def heatmap_recalc_dfs(param_set, param_dict, scenario):
-    """Compute heatmap data for a given case/scenario
-
-    Args:
-        param_set (tuple): Parameter values to use
-        param_dict (dict): Parameter dictionary
-        scenario (str): The scenario/case to compute
-
-    Returns:
-        pd.DataFrame: The calculated heatmap dataframe
-    """
-    temp_dict = dict(zip(param_dict.keys(), param_set))
-    load_json = True
-    if scenario == "normal":
-        return process_full_df.get_df(scenario = "normal", load_json = load_json, **temp_dict)
-    elif scenario == "ccu":
-        return process_full_df.get_df(scenario = "ccu", CCU_coupling=True, DACCS = True, compensate=False, load_json= load_json, **temp_dict)
-    elif scenario == "comp":
-        return process_full_df.get_df(scenario = "comp", CCU_coupling=True, DACCS=False, compensate=True, load_json=load_json, **temp_dict)
-
-
-    return [df_normal, df_ccu, df_comp]
-
-
-    
-
 def get_basic_LCOPs(inputs:dict):
     """Obtain basic LCOPs for the given set of parameters (currently low-emission H2 cost and non-fossil CO2 cost)
 
@@ -0,0 +1,159 @@
+"""Opt-in profiling of sampled process_inputs calls and heat map jobs.
+
+A fraction of the calls (sample_rate) is profiled with cProfile and tracemalloc. Each profiled call writes
+three files, named <time>-<kind>-<id>, to the profiles directory:
+    .prof      the cProfile stats (open with pstats or snakeviz)
+    .heap      the tracemalloc snapshot at the end of the call, with the memory allocated during the call and
+               still held (tracemalloc.Snapshot.load)
+    .json      a summary: kind, duration, peak traced memory, top functions and allocations
+Only the newest keep calls are kept.
+
+The sample rate and the number of calls kept are set in the profiling entry of config/global.yml, and can be
+overridden with the PROFILE_SAMPLE_RATE and PROFILE_KEEP environment variables. The directory is
+.cache/profiles, or PROFILE_DIR.
+
+Usage (list the profiled calls, or show one):
+    python -m src.profiling [ID] [--top N]
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import pathlib
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+from src.utils import BASE_PATH, load_yaml_config_file
+
+
+PROFILE_DIR = pathlib.Path(os.environ.get('PROFILE_DIR', BASE_PATH / '.cache' / 'profiles'))
+# number of functions and allocation sites in the summaries
+TOP = 20
+
+# one profiled call at a time: tracemalloc is process wide
+_lock = threading.Lock()
+_config = None
+
+
+def get_config() -> dict:
+    """The sample rate (fraction of the calls profiled) and the number of profiled calls kept"""
+    global _config
+    if _config is None:
+        config = {'sample_rate': 0.0, 'keep': 50}
+        config.update(load_yaml_config_file('global').get('profiling') or {})
+        if 'PROFILE_SAMPLE_RATE' in os.environ:
+            config['sample_rate'] = float(os.environ['PROFILE_SAMPLE_RATE'])
+        if 'PROFILE_KEEP' in os.environ:
+            config['keep'] = int(os.environ['PROFILE_KEEP'])
+        _config = config
+    return _config
+
+
+@contextmanager
+def sampled(kind: str, **fields):
+    """Profiles the block if it is sampled (see get_config), and writes the results to the profiles directory
+
+    Calls running while another call is profiled are not sampled.
+
+    Args:
+        kind (str): kind of the call, e.g. process_inputs
+        **fields: added to the summary
+    """
+    config = get_config()
+    if config['sample_rate'] <= 0 or random.random() >= config['sample_rate'] or not _lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            heap = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if not was_tracing:
+                tracemalloc.stop()
+            _write(kind, fields, duration, peak, profile, heap, config['keep'])
+    finally:
+        _lock.release()
+
+
+def list_profiles() -> list:
+    """Returns the summaries of the profiled calls, newest first"""
+    summaries = []
+    for path in sorted(PROFILE_DIR.glob('*.json'), reverse=True):
+        with open(path) as f:
+            summaries.append(json.load(f))
+    return summaries
+
+
+def _write(kind, fields, duration, peak, profile, heap, keep):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    profile_id = uuid.uuid4().hex[:12]
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{kind}-{profile_id}"
+
+    profile.dump_stats(PROFILE_DIR / f"{name}.prof")
+    heap.dump(str(PROFILE_DIR / f"{name}.heap"))
+
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(TOP)
+    summary = {
+        'id': profile_id,
+        'name': name,
+        'kind': kind,
+        **fields,
+        'pid': os.getpid(),
+        'duration_s': round(duration, 6),
+        'peak_traced_kib': round(peak / 1024, 1),
+        'top_functions': stream.getvalue().splitlines(),
+        'top_allocations': [str(stat) for stat in heap.statistics('lineno')[:TOP]],
+    }
+    with open(PROFILE_DIR / f"{name}.json", 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    _rotate(keep)
+
+
+def _rotate(keep):
+    # removes the files of all but the newest keep calls
+    for path in sorted(PROFILE_DIR.glob('*.json'), reverse=True)[keep:]:
+        for suffix in ('.json', '.prof', '.heap'):
+            path.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lists the profiled calls, or shows one")
+    parser.add_argument("id", nargs="?", help="id of the profiled call to show")
+    parser.add_argument("--top", type=int, default=TOP, help="number of functions shown")
+    args = parser.parse_args()
+
+    summaries = list_profiles()
+    if args.id is None:
+        for summary in summaries:
+            print(f"{summary['id']}  {summary['name']:<50} {summary['duration_s'] * 1000:9.1f} ms "
+                  f"{summary['peak_traced_kib']:9.0f} KiB")
+        return
+
+    summary = next((s for s in summaries if s['id'] == args.id), None)
+    if summary is None:
+        parser.error(f"no profiled call {args.id} in {PROFILE_DIR}")
+    pstats.Stats(str(PROFILE_DIR / f"{summary['name']}.prof")).sort_stats('cumulative').print_stats(args.top)
+    print("\n".join(summary['top_allocations']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+# seconds after the last access a session is removed, and maximum number of sessions kept
+SESSION_TTL = 3600
+MAX_SESSIONS = 1024
+
+
+def new_session_id() -> str:
+    """Returns a new random session id"""
+    return uuid.uuid4().hex
+
+
+class SessionStore:
+    """In-process store of per-session state, with TTL eviction
+
+    Each user session (browser tab, see the session-id Store created in ctrls.hm_ctrl and filled by
+    ctrls.init_session_id) has its own state dict, created by factory on first access. Sessions not accessed for ttl
+    seconds are removed, as well as the least recently used ones if there are more than maxsize sessions.
+
+    Args:
+        factory (callable): returns the initial state of a session
+        ttl (float): seconds after the last access a session is removed
+        maxsize (int): maximum number of sessions
+    """
+
+    def __init__(self, factory=dict, ttl=SESSION_TTL, maxsize=MAX_SESSIONS):
+        self.factory = factory
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id) -> dict:
+        """Returns the state of a session, creating it if needed. The state can be modified in place
+
+        Args:
+            session_id (str): the session id
+
+        Returns:
+            dict: the state of the session
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._sessions.pop(session_id, None)
+            state = self.factory() if entry is None else entry[1]
+            self._sessions[session_id] = (now, state)
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+            return state
+
+    def drop(self, session_id):
+        """Removes a session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
+
+    def _evict(self, now):
+        # the sessions are ordered by last access
+        while self._sessions:
+            last_access, _ = next(iter(self._sessions.values()))
+            if now - last_access <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
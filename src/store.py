@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from calc import engine
+from src.utils import BASE_PATH
+
+try:
+    import fcntl
+except ImportError:  # not available on windows, the store then works without locking
+    fcntl = None
+
+
+# directory of the precomputed heat map data, can be overridden with the HEATMAP_STORE_DIR environment variable
+STORE_DIR = pathlib.Path(os.environ.get('HEATMAP_STORE_DIR', BASE_PATH / '.cache' / 'heatmap'))
+# number of entries kept in the store, the older ones are removed when an entry is written (see prune). Can be
+# overridden with the HEATMAP_STORE_KEEP environment variable
+KEEP_ENTRIES = int(os.environ.get('HEATMAP_STORE_KEEP', 4))
+# bump when the content of the stored frames changes without a change of params.json or of the grid (e.g. the
+# refinement of the axes, see landscape.refine_axes)
+FORMAT_VERSION = 3
+
+
+def get_key(param_dict: dict, path_to_params: str = engine.DEFAULT_PARAMS_PATH):
+    """Key of the heat map data computed on a grid of parameters
+
+    The key is made of a hash of the params file and a hash of the grid, so that entries are
+    invalidated automatically when the params file changes.
+
+    Args:
+        param_dict (dict): parameter name -> list of values, as passed to engine.param_grid
+        path_to_params (str): path to the params file
+
+    Returns:
+        str: key of the entry in the store
+    """
+    with open(path_to_params, 'rb') as f:
+        params_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+    grid = {k: np.asarray(v).tolist() for k, v in sorted(param_dict.items())}
+    grid_hash = hashlib.sha256(json.dumps([FORMAT_VERSION, grid]).encode()).hexdigest()[:16]
+    return f"{params_hash}-{grid_hash}"
+
+
+def load(key: str):
+    """Load an entry of the store. The columns are memory-mapped (read-only), text columns as pd.Categorical over
+    the memory-mapped codes
+
+    Args:
+        key (str): key of the entry, see get_key
+
+    Returns:
+        pd.DataFrame: the stored data, or None if there is no such entry
+    """
+    path = STORE_DIR / key
+    if not (path / 'meta.json').exists():
+        return None
+    with open(path / 'meta.json', 'r') as f:
+        meta = json.load(f)
+
+    columns = {}
+    for i, (col, categories) in enumerate(zip(meta['columns'], meta['categories'])):
+        # plain array view of the memory map, the data is still read from the file
+        values = np.load(path / f"{i}.npy", mmap_mode='r').view(np.ndarray)
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, categories=categories, validate=False)
+        columns[col] = values
+    return pd.DataFrame(columns, copy=False)
+
+
+def save(key: str, df: pd.DataFrame, keep: int = None):
+    """Write an entry to the store, one .npy file per column. Text columns are stored as categorical codes, with
+    the categories in meta.json
+
+    The entry is written to a temporary directory and moved in place, so that readers never see
+    a partially written entry. The store is then pruned to the keep newest entries (see prune).
+
+    Args:
+        key (str): key of the entry, see get_key
+        df (pd.DataFrame): data to store
+        keep (int): number of entries kept, KEEP_ENTRIES if None
+    """
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = pathlib.Path(tempfile.mkdtemp(dir=STORE_DIR, prefix='.tmp-'))
+    meta = {'columns': [], 'categories': []}
+    for i, col in enumerate(df.columns):
+        values = df[col]
+        categories = None
+        if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+            # missing values have the code -1
+            values = pd.Categorical(values)
+            values, categories = values.codes, values.categories.tolist()
+        np.save(tmp_path / f"{i}.npy", np.asarray(values))
+        meta['columns'].append(col)
+        meta['categories'].append(categories)
+    with open(tmp_path / 'meta.json', 'w') as f:
+        json.dump(meta, f)
+
+    try:
+        os.rename(tmp_path, STORE_DIR / key)
+    except OSError:
+        # entry written concurrently by another process
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    prune(keep, protect=key)
+
+
+def entries() -> list:
+    """Keys of the entries of the store, the most recently written first"""
+    if not STORE_DIR.exists():
+        return []
+    written = {}
+    for path in STORE_DIR.iterdir():
+        if path.name.startswith('.'):
+            continue
+        try:
+            written[path.name] = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            # removed concurrently by another process
+            continue
+    return sorted(written, key=written.get, reverse=True)
+
+
+def prune(keep: int = None, protect: str = None) -> list:
+    """Removes all but the keep most recently written entries of the store (e.g. the entries computed from previous
+    versions of the params file or on other grids)
+
+    Args:
+        keep (int): number of entries kept, KEEP_ENTRIES if None
+        protect (str): key of an entry that is never removed and counts as one of the kept entries (e.g. the one
+            just written)
+
+    Returns:
+        list: keys of the removed entries
+    """
+    if keep is None:
+        keep = KEEP_ENTRIES
+    removed = [key for key in entries() if key != protect][max(0, keep - (protect is not None)):]
+    for key in removed:
+        shutil.rmtree(STORE_DIR / key, ignore_errors=True)
+    return removed
+
+
+def load_or_compute(key: str, compute):
+    """Load an entry of the store, computing and saving it first if needed
+
+    Only one process computes a missing entry, the others wait for it and load the result.
+
+    Args:
+        key (str): key of the entry, see get_key
+        compute (callable): function without arguments returning the data as a pd.DataFrame
+
+    Returns:
+        pd.DataFrame: the stored data
+    """
+    df = load(key)
+    if df is not None:
+        return df
+    with _lock(key):
+        df = load(key)
+        if df is None:
+            save(key, compute())
+            df = load(key)
+    return df
+
+
+@contextmanager
+def _lock(key: str):
+    if fcntl is None:
+        yield
+        return
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(STORE_DIR / f".{key}.lock", 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
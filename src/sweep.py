@@ -0,0 +1,218 @@
+"""Batch evaluation of large sweeps of the parameters, streamed to disk chunk by chunk.
+
+A sweep is the cartesian product of the values of the parameters (see engine.param_grid), evaluated for each
+scenario with process_full_df.get_df_grid (one row per point, scenario and sector, with the selected option).
+The grid is split into chunks of consecutive points evaluated by the worker processes (see pool.imap_grid), and
+each chunk is written to its own file of the output directory as soon as it is done:
+    part-00000.csv or part-00000.parquet    the rows of each chunk
+    manifest.json                           the spec, the number of chunks and the chunks done
+Only a few chunks are held in memory at a time. A part file is written under a temporary name and renamed once
+complete, and then added to the manifest, so that an interrupted sweep can be resumed from the chunks done.
+
+The spec is a YAML (or JSON) file, e.g. config/sweeps/example.yml:
+    params:               parameter name -> list of values, a single value, or {start, stop, step} (stop included)
+    scenarios:            scenarios evaluated, keys of process_full_df.SCENARIO_ARGS (default: all)
+    sectors:              sectors written (default: all). The options are selected over all sectors
+    columns:              columns written (default: all but the labels and colours of the options)
+    chunk_size:           number of points per chunk (default: 20000)
+    format:               csv or parquet (default: csv). Parquet needs pyarrow or fastparquet
+"""
+import hashlib
+import json
+import logging
+import os
+import pathlib
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from calc import engine
+from calc import process_full_df
+from calc.process_full_df import SCENARIO_ARGS
+from src import pool
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+FORMATS = ("csv", "parquet")
+CHUNK_SIZE = 20000
+# columns of get_df_grid not written by default: the labels and colours of the options, for the plots
+DROPPED_COLUMNS = ("code", "color_type")
+
+
+def load_spec(path) -> dict:
+    """Reads a sweep spec and fills in the defaults
+
+    Args:
+        path (str): path of the YAML or JSON spec
+
+    Returns:
+        dict: the spec, with the values of each parameter as a list
+    """
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    return normalize_spec(spec)
+
+
+def normalize_spec(spec: dict) -> dict:
+    """Checks a sweep spec, expands the parameter ranges and fills in the defaults (see the module docstring)"""
+    if not spec.get("params"):
+        raise ValueError("the sweep spec has no params")
+
+    params = {name: _expand_values(name, values) for name, values in spec["params"].items()}
+    scenarios = list(spec.get("scenarios") or SCENARIO_ARGS)
+    unknown = set(scenarios) - set(SCENARIO_ARGS)
+    if unknown:
+        raise ValueError(f"unknown scenarios {sorted(unknown)}, expected some of {list(SCENARIO_ARGS)}")
+    output_format = spec.get("format", "csv")
+    if output_format not in FORMATS:
+        raise ValueError(f'unknown format "{output_format}", expected one of {FORMATS}')
+    chunk_size = int(spec.get("chunk_size", CHUNK_SIZE))
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+    return {
+        "params": params,
+        "scenarios": scenarios,
+        "sectors": spec.get("sectors"),
+        "columns": spec.get("columns"),
+        "chunk_size": chunk_size,
+        "format": output_format,
+    }
+
+
+def spec_hash(spec: dict) -> str:
+    """Hash of a normalized spec, a sweep is only resumed with the same spec"""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def evaluate_chunk(points: dict, scenarios: list, sectors: list = None, columns: list = None) -> pd.DataFrame:
+    """Evaluates the scenarios of a sweep at the given points (run by the worker processes)
+
+    Args:
+        points (dict): parameter name -> one value per point, see engine.param_grid
+        scenarios (list): scenarios, keys of process_full_df.SCENARIO_ARGS
+        sectors (list): sectors whose rows are returned, all if None
+        columns (list): columns returned, all but DROPPED_COLUMNS if None
+
+    Returns:
+        pd.DataFrame: the get_df_grid results of the scenarios
+    """
+    dfs = [
+        process_full_df.get_df_grid(scenario=scenario, sectors=sectors, **SCENARIO_ARGS[scenario], **points)
+        for scenario in scenarios
+    ]
+    df = pd.concat(dfs, ignore_index=True)
+    if columns is None:
+        return df.drop(columns=[c for c in DROPPED_COLUMNS if c in df.columns])
+    return df[columns]
+
+
+def run_sweep(spec: dict, output_dir, resume: bool = False, progress=None) -> dict:
+    """Evaluates a sweep and writes its chunks to output_dir (see the module docstring)
+
+    Args:
+        spec (dict): the normalized spec, see load_spec
+        output_dir (str): output directory, created if needed
+        resume (bool): whether to skip the chunks done by a previous run of the same spec. Without resume, the
+            output directory must not contain a sweep
+        progress (callable): called with the number of chunks done, the number of chunks and the number of rows
+            of the chunk after each chunk
+
+    Returns:
+        dict: the manifest
+    """
+    output_dir = pathlib.Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if spec["format"] == "parquet":
+        _check_parquet()
+
+    n_points = engine.grid_size(spec["params"])
+    manifest = read_manifest(output_dir)
+    if manifest is not None and not resume:
+        raise FileExistsError(f"{output_dir} already contains a sweep, resume it or choose another directory")
+    if manifest is not None and manifest["spec_hash"] != spec_hash(spec):
+        raise ValueError(f"the sweep in {output_dir} was started with another spec, it cannot be resumed")
+    if manifest is None:
+        manifest = {
+            "spec": spec,
+            "spec_hash": spec_hash(spec),
+            "n_points": n_points,
+            "n_chunks": -(-n_points // spec["chunk_size"]),
+            "done": [],
+            "rows": 0,
+        }
+        _write_manifest(output_dir, manifest)
+
+    done = set(manifest["done"])
+    if done:
+        logger.info("resuming %s: %d of %d chunks done", output_dir, len(done), manifest["n_chunks"])
+
+    chunks = pool.imap_grid(
+        evaluate_chunk, spec["params"], spec["chunk_size"], skip=done,
+        scenarios=spec["scenarios"], sectors=spec["sectors"], columns=spec["columns"],
+    )
+    for index, df in chunks:
+        _write_part(output_dir, index, df, spec["format"])
+        manifest["done"].append(index)
+        manifest["rows"] += len(df)
+        _write_manifest(output_dir, manifest)
+        if progress is not None:
+            progress(len(manifest["done"]), manifest["n_chunks"], len(df))
+
+    manifest["done"].sort()
+    _write_manifest(output_dir, manifest)
+    return manifest
+
+
+def read_manifest(output_dir):
+    """Returns the manifest of the sweep in output_dir, None if there is none"""
+    path = pathlib.Path(output_dir) / MANIFEST
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def part_path(output_dir, index: int, output_format: str) -> pathlib.Path:
+    return pathlib.Path(output_dir) / f"part-{index:05d}.{output_format}"
+
+
+def _expand_values(name, values) -> list:
+    if isinstance(values, dict):
+        if set(values) != {"start", "stop", "step"}:
+            raise ValueError(f"the range of {name} must have a start, stop and step")
+        # stop is included, up to rounding
+        values = np.arange(values["start"], values["stop"] + values["step"] / 2, values["step"])
+    values = np.atleast_1d(values).tolist()
+    if not values:
+        raise ValueError(f"no values for {name}")
+    return values
+
+
+def _check_parquet():
+    try:
+        pd.io.parquet.get_engine("auto")
+    except ImportError as e:
+        raise ImportError(f"the parquet format needs pyarrow or fastparquet ({e}), or use the csv format") from e
+
+
+def _write_part(output_dir, index, df, output_format):
+    # written under a temporary name, so that a part file is always complete
+    path = part_path(output_dir, index, output_format)
+    tmp_path = path.with_name(path.name + ".tmp")
+    if output_format == "parquet":
+        df.to_parquet(tmp_path, index=False)
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(output_dir, manifest):
+    path = pathlib.Path(output_dir) / MANIFEST
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
@@ -1,8 +1,13 @@
 from src.ctrls import input_fields
+from src import metrics
 from dash import callback_context
 
 # update callback function
 def update_inputs(inputs_updated: dict, btn_pressed: str,  args: list):
+    with metrics.stage("update_inputs"):
+        return _update_inputs(inputs_updated, btn_pressed, args)
+
+def _update_inputs(inputs_updated: dict, btn_pressed: str,  args: list):
     ctx = callback_context
     #no update if no button pressed
     if not ctx.triggered or ctx.triggered[0]['value'] is None:
@@ -23,4 +28,7 @@ def update_inputs(inputs_updated: dict, btn_pressed: str,  args: list):
     #for capex table, need to extract the capex values from the dictionnaries
     inputs_updated['steel_capex'] = [entry['steel_capex_value'] for entry in args[10]]
 
+    #args[11] is the id of the finished heat map recalculation, see ctrls.poll_hm_job
+    inputs_updated['session_id'] = args[12]
+
     
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""Evaluates a sweep of the parameters and streams the results to an output directory, see src/sweep.py.
+
+Usage:
+    python sweep.py SPEC OUTPUT_DIR [--resume] [--chunk-size N] [--format csv|parquet] [--workers N]
+"""
+import argparse
+import logging
+import time
+
+from src import pool
+from src import sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", help="YAML or JSON spec of the sweep, e.g. config/sweeps/example.yml")
+    parser.add_argument("output_dir", help="directory the chunks and the manifest are written to")
+    parser.add_argument("--resume", action="store_true", help="skip the chunks done by a previous run")
+    parser.add_argument("--chunk-size", type=int, help="number of points per chunk, overrides the spec")
+    parser.add_argument("--format", choices=sweep.FORMATS, help="output format, overrides the spec")
+    parser.add_argument("--workers", type=int, help=f"number of worker processes (default: {pool.N_WORKERS})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    spec = sweep.load_spec(args.spec)
+    if args.chunk_size:
+        spec["chunk_size"] = args.chunk_size
+    if args.format:
+        spec["format"] = args.format
+    if args.workers:
+        pool.N_WORKERS = args.workers
+
+    start = time.perf_counter()
+
+    def progress(n_done, n_chunks, rows):
+        elapsed = time.perf_counter() - start
+        print(f"chunk {n_done}/{n_chunks} done ({rows} rows, {elapsed:.1f} s)", flush=True)
+
+    try:
+        manifest = sweep.run_sweep(spec, args.output_dir, resume=args.resume, progress=progress)
+    finally:
+        pool.shutdown()
+    print(f"{manifest['n_points']} points, {manifest['rows']} rows written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from src import store
+
+
+# parameter points of the checks against the baseline calculations: the defaults, the corners of the heat map grid,
+# and points where options of several sectors have the same FSCP (no co2 cost, see get_lowest_fscp)
+POINTS = [
+    {"h2_LCO": 70.0, "co2_LCO": 300.0, "co2ts_LCO": 15.0},
+    {"h2_LCO": 0.0, "co2_LCO": 0.0, "co2ts_LCO": 15.0},
+    {"h2_LCO": 240.0, "co2_LCO": 1200.0, "co2ts_LCO": 15.0},
+    {"h2_LCO": 25.0, "co2_LCO": 0.0, "co2ts_LCO": 15.0},
+    {"h2_LCO": 120.0, "co2_LCO": 650.0, "co2ts_LCO": 50.0},
+]
+
+
+def as_arrays(points: list) -> dict:
+    """Points as a dict of arrays, one value per point (see engine.param_grid)"""
+    return {k: np.array([p[k] for p in points]) for k in points[0]}
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    """An empty on-disk store of the heat map data"""
+    monkeypatch.setattr(store, "STORE_DIR", tmp_path / "heatmap")
+    return store.STORE_DIR
@@ -0,0 +1,9 @@
+import pytest
+
+from benchmarks import bench_breakdown
+from tests.conftest import POINTS
+
+
+@pytest.mark.parametrize("point", POINTS)
+def test_breakdown_matches_row_by_row_implementation(point):
+    bench_breakdown.check_same_result(bench_breakdown.get_components(**point))
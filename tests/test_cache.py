@@ -0,0 +1,42 @@
+import pandas as pd
+
+from calc import cache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = cache.LRUCache(maxsize=2)
+    lru.put("a", 1)
+    lru.put("b", 2)
+    assert lru.get("a") == 1
+    lru.put("c", 3)
+
+    assert "b" not in lru and "a" in lru and "c" in lru
+    assert lru.stats() == {"hits": 1, "misses": 0, "evictions": 1, "size": 2, "maxsize": 2}
+    assert lru.get("b") is None and lru.misses == 1
+
+
+def test_canonical_key():
+    assert cache.canonical_key({"a": 0.1 + 0.2, "b": 1}) == cache.canonical_key({"b": 1.0, "a": 0.3})
+    assert cache.canonical_key({"techs": ["b", "a"]}) == cache.canonical_key({"techs": ("a", "b")})
+    assert cache.canonical_key({"a": 1}) != cache.canonical_key({"a": 2})
+
+
+def test_memoize_copies_and_version():
+    calls = []
+    version = {"stamp": 1}
+
+    @cache.memoize(maxsize=4, ignore=("verbose",), version=lambda params: version["stamp"])
+    def func(x, verbose=False):
+        calls.append(x)
+        return pd.DataFrame({"x": [x]})
+
+    func(1)
+    df = func(1, verbose=True)
+    assert calls == [1]
+    # the cached result is not modified through the returned copies
+    df["x"] = 0
+    assert func(1)["x"].iat[0] == 1
+
+    version["stamp"] = 2
+    func(1)
+    assert calls == [1, 1]
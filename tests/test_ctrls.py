@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+# the plots need piw
+pytest.importorskip("piw")
+from dash import Patch, no_update
+
+from src import ctrls
+from src import jobs
+
+
+@pytest.fixture
+def hm_jobs(monkeypatch):
+    manager = jobs.JobManager(max_workers=1)
+    monkeypatch.setattr(ctrls.proc, "hm_jobs", manager)
+    yield manager
+    manager.shutdown()
+
+
+def test_poll_hm_job(hm_jobs):
+    release = threading.Event()
+    job = hm_jobs.submit("key", lambda progress=None: release.wait(5))
+
+    # nothing to poll
+    assert ctrls.poll_hm_job(1, None, None, "normal") == (no_update, no_update)
+
+    # running: only the title of the heat maps is updated
+    fig, ready = ctrls.poll_hm_job(1, job.id, None, "normal")
+    assert isinstance(fig, Patch) and ready is no_update
+    operation, = fig.to_plotly_json()["operations"]
+    assert operation["location"] == ["layout", "title", "text"]
+    assert "Updating the landscapes" in operation["params"]["value"]
+
+    # finished: the heat maps are regenerated once
+    release.set()
+    assert job.wait(5)
+    assert ctrls.poll_hm_job(2, job.id, None, "normal") == (no_update, job.id)
+    assert ctrls.poll_hm_job(3, job.id, job.id, "normal") == (no_update, no_update)
+
+    # unknown to this process (e.g. another worker): regenerated, the recalculation is submitted again
+    assert ctrls.poll_hm_job(4, "unknown", job.id, "normal") == (no_update, "unknown")
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from calc import engine
+from calc import process_full_df
+from calc.process_full_df import SCENARIO_ARGS
+from src.cube import HeatMapCube, TYPE_IDS
+
+
+PARAM_DICT = {"h2_LCO": [0, 60, 120, 240], "co2_LCO": [0, 300, 1200], "co2ts_LCO": [15]}
+
+
+def get_hm_df():
+    points = engine.param_grid(PARAM_DICT)
+    return pd.concat([
+        process_full_df.get_df_grid(scenario=scenario, **args, **points) for scenario, args in SCENARIO_ARGS.items()
+    ], ignore_index=True)
+
+
+def test_from_df_matrices():
+    df = get_hm_df()
+    cube = HeatMapCube.from_df(df)
+
+    assert cube.scenarios == list(SCENARIO_ARGS)
+    assert cube.sectors == sorted(df["sector"].unique())
+    np.testing.assert_array_equal(cube.h2_LCO, PARAM_DICT["h2_LCO"])
+    np.testing.assert_array_equal(cube.co2_LCO, PARAM_DICT["co2_LCO"])
+
+    for row in df.itertuples():
+        i, j = list(cube.h2_LCO).index(row.h2_LCO), list(cube.co2_LCO).index(row.co2_LCO)
+        matrices = cube.matrices(row.scenario, row.sector)
+        assert matrices["type_ID"][i, j] == TYPE_IDS[row.type]
+        assert matrices["fscp"][i, j] == np.float32(row.fscp)
+        assert matrices["delta_fscp"][i, j] == np.float32(row.delta_fscp)
+        assert cube.labels(matrices["code_id"][i, j]) == row.code
+
+
+def test_missing_cells_and_hm_dfs():
+    df = get_hm_df()
+    # a cell without data
+    df = df.drop(df.index[(df["scenario"] == "normal") & (df["sector"] == "steel") & (df["h2_LCO"] == 0) & (df["co2_LCO"] == 0)])
+    cube = HeatMapCube.from_df(df)
+
+    matrices = cube.matrices("normal", "steel")
+    assert np.isnan(matrices["type_ID"][0, 0]) and np.isnan(matrices["fscp"][0, 0])
+    assert not isinstance(cube.labels(matrices["code_id"][0, 0]), str)
+
+    hm_dfs = cube.hm_dfs("normal")
+    assert hm_dfs["contour_df"].shape == (len(cube.sectors) * len(cube.h2_LCO), len(cube.co2_LCO))
+    np.testing.assert_array_equal(hm_dfs["contour_df"].loc["steel"].to_numpy(), matrices["fscp"].astype(float))
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calc import calc_costs
+from calc import engine
+from tests.conftest import POINTS, as_arrays
+
+
+FLAGS = [
+    {},
+    {"ccu_income": True},
+    {"compensate_residual_ems": True},
+    {"ccu_income": True, "compensate_residual_ems": True, "inexistant_techs": ["comp_plane", "blueh2_steel"]},
+]
+
+
+@pytest.mark.parametrize("flags", FLAGS)
+def test_loop_matches_calc_all_LCO(flags):
+    result = engine.get_engine().evaluate(**flags, **as_arrays(POINTS)).to_df()
+
+    for i, point in enumerate(POINTS):
+        expected = calc_costs.calc_all_LCO(**flags, **point)
+        actual = result[result["point"] == i].drop(columns="point").reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_user_params_per_tech():
+    point = {"h2_LCO": 100.0, "co2_LCO": 200.0, "fossil_steel_capex": 500.0, "h2_steel_capex": 900.0}
+    result = engine.get_engine().evaluate(**as_arrays([point])).to_df().drop(columns="point")
+
+    pd.testing.assert_frame_equal(result, calc_costs.calc_all_LCO(**point), check_dtype=False)
+
+
+def test_param_grid_chunk():
+    param_dict = {"h2_LCO": [0, 5, 10], "co2_LCO": [0, 100], "co2ts_LCO": [15, 30]}
+    grid = engine.param_grid(param_dict)
+    assert engine.grid_size(param_dict) == len(grid["h2_LCO"]) == 12
+
+    chunks = [engine.param_grid_chunk(param_dict, start, min(start + 5, 12)) for start in range(0, 12, 5)]
+    for name, values in grid.items():
+        np.testing.assert_array_equal(np.concatenate([chunk[name] for chunk in chunks]), values)
+
+
+@pytest.mark.parametrize("flags", FLAGS)
+def test_matrix_matches_loop(flags):
+    rng = np.random.default_rng(0)
+    n = 200
+    params = {
+        "h2_LCO": rng.uniform(0, 240, n),
+        "co2_LCO": rng.uniform(0, 1200, n),
+        "co2ts_LCO": rng.uniform(0, 50, n),
+        "co2ccu_co2em": rng.uniform(0, 1, n),
+        "elec_LCO": rng.uniform(10, 120, n),
+    }
+    calc_engine = engine.get_engine()
+    loop = calc_engine.evaluate(method="loop", **flags, **params)
+    matrix = calc_engine.evaluate(method="matrix", **flags, **params)
+
+    assert matrix.techs == loop.techs and matrix.codes == loop.codes
+    # values that cancel out to zero in the loop (e.g. captured emissions) are only zero to floating point precision
+    for col in engine.RESULT_COLUMNS:
+        np.testing.assert_allclose(matrix[col], loop[col], rtol=1e-9, atol=1e-12, equal_nan=True)
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from src import jobs
+
+
+@pytest.fixture
+def manager():
+    manager = jobs.JobManager(max_workers=2, keep_finished=2)
+    yield manager
+    manager.shutdown()
+
+
+def test_identical_jobs_run_once(manager):
+    release = threading.Event()
+    calls = []
+
+    def calc(x, progress=None):
+        calls.append(x)
+        progress(1, 2, "first half")
+        release.wait(5)
+        return x * 2
+
+    job = manager.submit("key", calc, 21)
+    assert manager.submit("key", calc, 21) is job
+    assert not job.wait(0.05)
+    assert manager.pending() == [job]
+
+    release.set()
+    assert job.wait(5)
+    assert job.result() == 42
+    assert job.progress()["status"] == jobs.DONE
+    assert manager.submit("key", calc, 21) is job
+    assert calls == [21]
+
+
+def test_failed_job_is_resubmitted(manager):
+    def fail(progress=None):
+        raise ValueError("failed")
+
+    job = manager.submit("key", fail)
+    assert job.wait(5)
+    assert job.status == jobs.FAILED
+    with pytest.raises(ValueError):
+        job.result()
+
+    assert manager.submit("key", lambda progress=None: 1) is not job
+
+
+def test_finished_jobs_are_pruned(manager):
+    finished = [manager.submit(key, lambda progress=None: None) for key in range(4)]
+    for job in finished:
+        job.wait(5)
+
+    assert manager.find(0) is None and manager.get(finished[0].id) is None
+    assert manager.find(3) is finished[3]
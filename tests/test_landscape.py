@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calc import engine
+from calc import landscape
+from calc import process_full_df
+from calc.process_full_df import SCENARIO_ARGS
+from src import load
+
+
+# the grid of the heat maps, and other values of the parameters not on the axes
+AXES = {"h2_LCO": np.arange(0, 245, 10), "co2_LCO": np.arange(0, 1250, 100)}
+OTHER_PARAMS = [
+    {"co2ts_LCO": 15.0},
+    {"co2ts_LCO": 30.0, "co2ccu_co2em": 0.0, "fossil_steel_capex": 500.0, "h2_steel_capex": 900.0},
+]
+COLUMNS = ["tech", "code", "type", "sector", "h2_LCO", "co2_LCO", "fscp", "delta_fscp", "cost", "em"]
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIO_ARGS))
+@pytest.mark.parametrize("other_params", OTHER_PARAMS)
+def test_rasterize_matches_get_df_grid(scenario, other_params):
+    hm_landscape = landscape.get_landscape(scenario, **SCENARIO_ARGS[scenario], **other_params)
+    df = hm_landscape.rasterize(AXES["h2_LCO"], AXES["co2_LCO"])
+
+    points = engine.param_grid(AXES)
+    expected = process_full_df.get_df_grid(scenario=scenario, **SCENARIO_ARGS[scenario], **other_params, **points)
+    pd.testing.assert_frame_equal(df[COLUMNS], expected[COLUMNS], check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIO_ARGS))
+def test_rasterize_matches_get_df(scenario):
+    hm_landscape = landscape.get_landscape(scenario, **SCENARIO_ARGS[scenario], co2ts_LCO=15.0)
+    # includes points where options of several sectors have the same FSCP (no co2 cost)
+    h2_values, co2_values = [0.0, 25.0, 70.0, 240.0], [0.0, 300.0, 1200.0]
+    df = hm_landscape.rasterize(h2_values, co2_values)
+
+    expected = pd.concat([
+        process_full_df.get_df(scenario=scenario, **SCENARIO_ARGS[scenario], co2ts_LCO=15.0, h2_LCO=h2, co2_LCO=co2)
+        for h2 in h2_values for co2 in co2_values
+    ], ignore_index=True)
+    pd.testing.assert_frame_equal(df[COLUMNS], expected[COLUMNS], check_dtype=False, rtol=1e-9)
+
+
+def test_calc_heatmap_data():
+    param_dict = {**AXES, "co2ts_LCO": [15.0]}
+    df = load.calc_heatmap_data(param_dict)
+
+    # the same refined axes for all scenarios
+    h2_values, co2_values = np.unique(df["h2_LCO"]), np.unique(df["co2_LCO"])
+    assert set(AXES["h2_LCO"]) < set(h2_values) and set(AXES["co2_LCO"]) < set(co2_values)
+    assert len(df) == len(SCENARIO_ARGS) * 5 * len(h2_values) * len(co2_values)
+    points = engine.param_grid({"h2_LCO": h2_values, "co2_LCO": co2_values, "co2ts_LCO": [15.0]})
+    for scenario, args in SCENARIO_ARGS.items():
+        expected = process_full_df.get_df_grid(scenario=scenario, **args, **points)
+        actual = df[df["scenario"] == scenario].reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual[COLUMNS], expected[COLUMNS], check_dtype=False, rtol=1e-9)
+    assert df["type_ID"].notna().all()
+
+
+def get_landscapes():
+    return [landscape.get_landscape(scenario, **args, co2ts_LCO=15.0) for scenario, args in SCENARIO_ARGS.items()]
+
+
+def switch_intervals(hm_landscape, h2_values, co2_values):
+    """Widths of the intervals of each axis across which the selected option of a sector changes"""
+    options = landscape._option_matrices(hm_landscape.rasterize(h2_values, co2_values), (h2_values, co2_values))
+    h2_switches = np.any(np.diff(options, axis=1) != 0, axis=(0, 2))
+    co2_switches = np.any(np.diff(options, axis=2) != 0, axis=(0, 1))
+    return np.diff(h2_values)[h2_switches], np.diff(co2_values)[co2_switches]
+
+
+def test_refine_axes_near_switches():
+    hm_landscapes = get_landscapes()
+    h2_values, co2_values = landscape.refine_axes(hm_landscapes, AXES["h2_LCO"], AXES["co2_LCO"], levels=2,
+                                                  max_points=10 ** 6)
+
+    for axis, values in zip(AXES.values(), (h2_values, co2_values)):
+        assert set(axis) <= set(values)
+        assert np.all(np.diff(values) > 0) and values[0] == axis[0] and values[-1] == axis[-1]
+    # the grid is finer where the options switch, and coarse elsewhere
+    for hm_landscape in hm_landscapes:
+        h2_widths, co2_widths = switch_intervals(hm_landscape, h2_values, co2_values)
+        assert np.median(h2_widths) == 2.5 and np.median(co2_widths) == 25
+    assert np.diff(h2_values).max() == 10 and np.diff(h2_values).min() == 2.5
+    assert np.diff(co2_values).min() == 25
+
+
+def test_refine_axes_max_points():
+    hm_landscapes = get_landscapes()
+    n_points = len(AXES["h2_LCO"]) * len(AXES["co2_LCO"])
+
+    h2_values, co2_values = landscape.refine_axes(hm_landscapes, AXES["h2_LCO"], AXES["co2_LCO"],
+                                                  max_points=n_points + 60)
+    assert n_points < len(h2_values) * len(co2_values) <= n_points + 60
+
+    for h2_values, co2_values in [
+        landscape.refine_axes(hm_landscapes, AXES["h2_LCO"], AXES["co2_LCO"], levels=0),
+        landscape.refine_axes(hm_landscapes, AXES["h2_LCO"], AXES["co2_LCO"], max_points=n_points),
+    ]:
+        np.testing.assert_array_equal(h2_values, AXES["h2_LCO"])
+        np.testing.assert_array_equal(co2_values, AXES["co2_LCO"])
@@ -0,0 +1,36 @@
+import plotly.graph_objects as go
+import pytest
+
+pytest.importorskip("piw")
+from src.plots import BasePlot as base_plot
+
+
+class CountingPlot:
+    _target = "webapp"
+
+    def __init__(self):
+        self.calls = 0
+
+    def _cache_key(self, inputs, outputs):
+        return inputs["key"]
+
+    @base_plot.cached_figures
+    def plot(self, inputs, outputs, subfig_names):
+        self.calls += 1
+        return {name: go.Figure(layout={"title": {"text": name}}) for name in subfig_names}
+
+
+def test_cached_figures_follow_params_stamp(monkeypatch):
+    monkeypatch.setattr(base_plot, "figures", base_plot.cache.LRUCache(maxsize=4))
+    monkeypatch.setattr(base_plot, "params_stamp", lambda params: (1.0, 100))
+    plot = CountingPlot()
+
+    first = plot.plot({"key": 1}, {}, ["fig1"])
+    second = plot.plot({"key": 1}, {}, ["fig1"])
+    assert plot.calls == 1
+    assert second["fig1"] is not first["fig1"] and second["fig1"].layout.title.text == "fig1"
+
+    # the params file changed
+    monkeypatch.setattr(base_plot, "params_stamp", lambda params: (2.0, 100))
+    plot.plot({"key": 1}, {}, ["fig1"])
+    assert plot.calls == 2
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calc import engine
+from src import pool
+
+
+PARAM_DICT = {"h2_LCO": np.arange(0, 50, 10), "co2_LCO": [0, 300], "co2ts_LCO": [15, 30]}
+
+
+def sum_points(points, offset=0):
+    return pd.DataFrame(points).sum(axis=1) + offset
+
+
+@pytest.fixture(autouse=True, scope="module")
+def workers():
+    yield
+    pool.shutdown()
+
+
+def test_imap_grid_skips_chunks():
+    results = dict(pool.imap_grid(sum_points, PARAM_DICT, chunk_size=3, skip={1}))
+
+    assert sorted(results) == [0, 2, 3, 4, 5, 6]
+    expected = pd.DataFrame(engine.param_grid(PARAM_DICT)).sum(axis=1)
+    np.testing.assert_array_equal(results[2].to_numpy(), expected[6:9].to_numpy())
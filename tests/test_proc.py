@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calc import process_full_df
+from src import proc
+
+
+# the inputs, and the step through the values of the axes of the points compared. The first inputs are the
+# counterexample of the per sector selection: without co2 cost, options of several sectors have the same FSCP (the
+# co2 transport and storage cost), and the tie is broken across sectors. They are compared at every point
+HM_INPUTS = [
+    ({"co2ts-LCO-hm": 15, "ccu_attribution": 0.0, "selected_case": "normal", "steel_capex": [500, 300, 900]}, 1),
+    ({"co2ts-LCO-hm": 30, "ccu_attribution": 0.5, "selected_case": "ccu", "steel_capex": [684, 196, 556]}, 3),
+    ({"co2ts-LCO-hm": 5, "ccu_attribution": 1.0, "selected_case": "comp", "steel_capex": [684, 196, 556]}, 3),
+]
+COLUMNS = ["h2_LCO", "co2_LCO", "sector", "tech", "type", "code", "fscp", "delta_fscp"]
+
+
+def get_df_brute_force(inputs, h2_values, co2_values):
+    """The heat map data of recalc_hm_df, from get_df at every point of the grid"""
+    bf_bof_capex, ccs_capex, dri_eaf_capex = inputs["steel_capex"]
+    params = {
+        "co2ts_LCO": inputs["co2ts-LCO-hm"],
+        "co2ccu_co2em": inputs["ccu_attribution"],
+        "fossil_steel_capex": bf_bof_capex,
+        "comp_steel_capex": bf_bof_capex,
+        "ccs_steel_capex": bf_bof_capex + ccs_capex,
+        "ccu_steel_capex": bf_bof_capex + ccs_capex,
+        "h2_steel_capex": dri_eaf_capex,
+    }
+    case = inputs["selected_case"]
+    return pd.concat([
+        process_full_df.get_df(scenario=case, h2_LCO=h2, co2_LCO=co2, **process_full_df.SCENARIO_ARGS[case], **params)
+        for h2 in h2_values for co2 in co2_values
+    ], ignore_index=True)
+
+
+@pytest.mark.parametrize("inputs, step", HM_INPUTS, ids=[inputs["selected_case"] for inputs, _ in HM_INPUTS])
+def test_recalc_hm_df_matches_get_df(inputs, step):
+    df = proc.recalc_hm_df(inputs)
+    h2_values, co2_values = np.unique(df["h2_LCO"])[::step], np.unique(df["co2_LCO"])[::step]
+    df = df[df["h2_LCO"].isin(h2_values) & df["co2_LCO"].isin(co2_values)]
+    expected = get_df_brute_force(inputs, h2_values, co2_values)
+
+    order = ["h2_LCO", "co2_LCO", "sector", "tech"]
+    df = df[COLUMNS].sort_values(order, ignore_index=True)
+    expected = expected[COLUMNS].sort_values(order, ignore_index=True)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, rtol=1e-9)
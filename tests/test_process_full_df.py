@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from calc import calc_costs
+from calc import process_full_df
+from calc.process_full_df import SCENARIO_ARGS
+from tests.conftest import POINTS, as_arrays
+
+
+@pytest.mark.parametrize("scenario", list(SCENARIO_ARGS))
+def test_get_df_grid_matches_get_df(scenario):
+    args = SCENARIO_ARGS[scenario]
+    expected = pd.concat(
+        [process_full_df.get_df(scenario=scenario, **args, **point) for point in POINTS], ignore_index=True
+    )
+    actual = process_full_df.get_df_grid(scenario=scenario, **args, **as_arrays(POINTS))
+
+    pd.testing.assert_frame_equal(actual, expected[actual.columns], check_dtype=False)
+
+
+def test_get_df_grid_sectors_are_selected_together():
+    # at the second point the options of several sectors have the same FSCP, the tie is broken across sectors
+    points = as_arrays(POINTS[:2])
+    df = process_full_df.get_df_grid(**points)
+    sectors = ["chem", "steel"]
+
+    pd.testing.assert_frame_equal(
+        process_full_df.get_df_grid(sectors=sectors, **points),
+        df[df["sector"].isin(sectors)].reset_index(drop=True),
+    )
+
+
+def test_get_df_is_memoized_by_copy():
+    df = process_full_df.get_df(scenario="normal", **POINTS[0])
+    expected = df.copy()
+    df["fscp"] = 0.0
+
+    pd.testing.assert_frame_equal(process_full_df.get_df(scenario="normal", **POINTS[0]), expected)
+
+
+def test_calc_all_LCO_wbreakdown_matches_calc_all_LCO():
+    df, LCO_components = calc_costs.calc_all_LCO_wbreakdown(**POINTS[0])
+
+    pd.testing.assert_frame_equal(df, calc_costs.calc_all_LCO(**POINTS[0]))
+    assert set(LCO_components["tech"]) <= set(df["tech"])
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from calc import process_full_df
+from calc import selection
+
+
+def random_options(rng, n_points, sectors):
+    # FSCPs drawn from a few values, so that there are ties within and across sectors, and negative FSCPs
+    sector_ids = np.repeat(np.arange(len(sectors)), 3)
+    shape = (n_points, len(sector_ids))
+    return {
+        "fscp": rng.choice([-20.0, -5.0, 0.0, 15.0, 40.0, 100.0], size=shape),
+        "cost": rng.choice([1.0, 2.0, 3.0], size=shape),
+        "em": rng.choice([0.1, 0.2], size=shape),
+    }, sector_ids
+
+
+def test_lowest_fscp_mask_matches_get_lowest_fscp():
+    rng = np.random.default_rng(0)
+    sectors = np.array(["cement", "chem", "plane", "ship", "steel"])
+    values, sector_ids = random_options(rng, 500, sectors)
+    candidates = np.ones(values["fscp"].shape, dtype=bool)
+
+    mask = selection.lowest_fscp_mask(values["fscp"], values["cost"], values["em"], candidates, sector_ids)
+
+    for i in range(len(mask)):
+        df = pd.DataFrame({"sector": sectors[sector_ids], **{k: v[i] for k, v in values.items()}})
+        expected = process_full_df.get_lowest_fscp(df).index
+        np.testing.assert_array_equal(np.flatnonzero(mask[i]), expected)
+
+
+def test_delta_fscp_matches_diff_fscp():
+    fscp = np.array([[10.0, 25.0, 5.0, 7.0], [10.0, 10.0, -5.0, 7.0]])
+    sector_ids = np.array([0, 0, 1, 1])
+    best = np.array([[True, False, True, False], [True, False, True, False]])
+    second_best = ~best
+
+    delta = selection.delta_fscp(fscp, best, second_best, sector_ids)
+
+    for i in range(len(fscp)):
+        for sector in (0, 1):
+            in_sector = sector_ids == sector
+            expected = process_full_df.diff_fscp(fscp[i, in_sector])
+            assert delta[i, best[i] & in_sector][0] == expected
+
+
+def test_ccu_possible_mask():
+    option_sectors = np.array(["plane", "plane", "steel", "steel"])
+    ccu_options = np.array([False, True, False, True])
+    best = np.array([
+        [True, False, True, False],  # no ccu
+        [False, True, False, True],  # ccu in an uptaker and a producer
+        [False, True, True, False],  # ccu in an uptaker only
+    ])
+
+    np.testing.assert_array_equal(selection.ccu_possible_mask(best, ccu_options, option_sectors), [True, True, False])
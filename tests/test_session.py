@@ -0,0 +1,29 @@
+from src import session
+
+
+def test_sessions_are_separate():
+    store = session.SessionStore(factory=lambda: {"n": 0})
+    store.get("a")["n"] += 1
+
+    assert store.get("a")["n"] == 1
+    assert store.get("b")["n"] == 0
+    assert len(store) == 2
+
+
+def test_ttl_and_maxsize(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(session.time, "monotonic", lambda: now[0])
+    store = session.SessionStore(ttl=10, maxsize=2)
+
+    store.get("a")["x"] = 1
+    now[0] = 5
+    store.get("b")
+    now[0] = 12
+    assert len(store) == 1
+    assert "x" not in store.get("a")
+
+    store.get("c")
+    store.get("d")
+    assert len(store) == 2
+    store.drop("d")
+    assert len(store) == 1
@@ -0,0 +1,66 @@
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import store
+
+
+def test_save_load(store_dir):
+    df = pd.DataFrame({
+        "h2_LCO": np.arange(4.0),
+        "type": ["h2", "ccu", np.nan, "h2"],
+        "sector": ["steel", "steel", "chem", "chem"],
+        "n": np.arange(4),
+    })
+    key = store.get_key({"h2_LCO": df["h2_LCO"]})
+
+    assert store.load(key) is None
+    store.save(key, df)
+    loaded = store.load(key)
+
+    pd.testing.assert_frame_equal(loaded, df, check_dtype=False, check_categorical=False)
+    assert isinstance(loaded["type"].dtype, pd.CategoricalDtype)
+    assert pd.isna(loaded["type"].iat[2])
+    # the codes are read from the file
+    base = loaded["sector"].array.codes
+    while getattr(base, "base", None) is not None:
+        base = base.base
+    assert isinstance(base, mmap.mmap)
+
+
+def test_load_or_compute(store_dir):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return pd.DataFrame({"x": [1.0, 2.0]})
+
+    key = store.get_key({"x": [1, 2]})
+    store.load_or_compute(key, compute)
+    df = store.load_or_compute(key, compute)
+
+    assert len(calls) == 1
+    assert df["x"].tolist() == [1.0, 2.0]
+
+
+def test_save_keeps_newest_entries(store_dir):
+    df = pd.DataFrame({"x": [1.0]})
+    keys = [store.get_key({"x": [i]}) for i in range(4)]
+    for written, key in enumerate(keys[:3], start=1):
+        store.save(key, df, keep=10)
+        os.utime(store_dir / key, (written, written))
+    assert store.entries() == keys[2::-1]
+
+    store.save(keys[3], df, keep=2)
+    assert store.entries() == [keys[3], keys[2]]
+    assert store.load(keys[0]) is None
+
+    assert store.prune(keep=1) == [keys[2]]
+    assert store.load(keys[3]) is not None
+
+
+def test_key_depends_on_grid():
+    assert store.get_key({"h2_LCO": [0, 5]}) == store.get_key({"h2_LCO": np.array([0, 5])})
+    assert store.get_key({"h2_LCO": [0, 5]}) != store.get_key({"h2_LCO": [0, 10]})
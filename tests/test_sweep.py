@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from calc import engine
+from calc import process_full_df
+from src import pool
+from src import sweep
+
+
+SPEC = {
+    "params": {"h2_LCO": {"start": 0, "stop": 100, "step": 50}, "co2_LCO": [0, 600], "co2ts_LCO": 15},
+    "scenarios": ["normal", "ccu"],
+    "chunk_size": 4,
+}
+
+
+@pytest.fixture(autouse=True, scope="module")
+def workers():
+    yield
+    pool.shutdown()
+
+
+def read_parts(output_dir, manifest):
+    return pd.concat(
+        [pd.read_csv(sweep.part_path(output_dir, index, "csv")) for index in range(manifest["n_chunks"])],
+        ignore_index=True,
+    )
+
+
+def test_normalize_spec():
+    spec = sweep.normalize_spec(SPEC)
+
+    assert spec["params"] == {"h2_LCO": [0, 50, 100], "co2_LCO": [0, 600], "co2ts_LCO": [15]}
+    with pytest.raises(ValueError):
+        sweep.normalize_spec({**SPEC, "scenarios": ["other"]})
+    with pytest.raises(ValueError):
+        sweep.normalize_spec({**SPEC, "format": "xlsx"})
+
+
+def test_run_and_resume(tmp_path):
+    spec = sweep.normalize_spec(SPEC)
+    manifest = sweep.run_sweep(spec, tmp_path / "full")
+    assert manifest["n_chunks"] == 2 and manifest["done"] == [0, 1]
+
+    # an interrupted sweep: only the first chunk was done
+    partial = tmp_path / "partial"
+    sweep.run_sweep(spec, partial)
+    sweep.part_path(partial, 1, "csv").unlink()
+    sweep._write_manifest(partial, {**sweep.read_manifest(partial), "done": [0], "rows": 0})
+    with pytest.raises(FileExistsError):
+        sweep.run_sweep(spec, partial)
+    resumed = sweep.run_sweep(spec, partial, resume=True)
+
+    df = read_parts(tmp_path / "full", manifest)
+    pd.testing.assert_frame_equal(read_parts(partial, resumed), df)
+
+    points = engine.param_grid(spec["params"])
+    expected = pd.concat([
+        process_full_df.get_df_grid(scenario=scenario, **process_full_df.SCENARIO_ARGS[scenario], **points)
+        for scenario in spec["scenarios"]
+    ], ignore_index=True)
+    # the rows are ordered by chunk, then by scenario
+    order = ["scenario", "h2_LCO", "co2_LCO", "sector"]
+    df = df.sort_values(order, ignore_index=True, kind="stable")
+    expected = expected.sort_values(order, ignore_index=True, kind="stable")
+    pd.testing.assert_frame_equal(df, expected[df.columns], check_dtype=False)
@@ -12,6 +12,7 @@ from src.plots.FuelStackedBarPlot import FuelStackedBarPlot
 from src.plots.AbatementCostPlot import AbatementCostPlot
 from src.plots.HeatMapPlot import HeatMapPlot
 from src.proc import process_inputs
+from src import metrics
 from src.update import update_inputs
 from src.utils import load_yaml_config_file
 
@@ -94,7 +95,10 @@ webapp = Webapp(
         State('co2ts-LCO-hm', 'value'),
         State('dropdown-case', 'value'),
         State('ccu-attr-hm', 'value'),
-        State("steel-capex-table", "data")
+        State("steel-capex-table", "data"),
+        # regenerates the heat maps once their recalculation in the background finished, see ctrls.poll_hm_job
+        Input('heatmap-ready', 'data'),
+        State('session-id', 'data'),
     ],
     update=[update_inputs],
     proc=[process_inputs],
@@ -109,4 +113,6 @@ webapp = Webapp(
 # this will allow running the webapp locally
 if __name__ == '__main__':
     webapp.start()
+    # stage timings in the logs, and the metrics endpoint if METRICS_ENDPOINT is set
+    metrics.init_app(webapp.flask_app)
     webapp.run()
@@ -2,6 +2,9 @@ import sys, os
 sys.path.insert(0,os.path.dirname(__file__))
 
 from webapp import webapp
+from src import metrics
 
 webapp.start()
+# stage timings in the logs, and the metrics endpoint if METRICS_ENDPOINT is set
+metrics.init_app(webapp.flask_app)
 application = webapp.flask_app